@@ -11,11 +11,12 @@ setup(
         "ipython>=8.0.0",
         "jupyter>=1.0.0",
         "requests>=2.28.0",
+        "urllib3>=1.26.0",
+        "httpx[http2]>=0.23.0",
         "python-dotenv>=0.19.0",
         "pyyaml>=6.0",
         "rich>=12.0.0",
-        "anthropic>=0.3.0",
-        "openai>=1.0.0",
+        "orjson>=3.6.0",
     ],
     python_requires=">=3.8",
     classifiers=[
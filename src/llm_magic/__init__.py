@@ -2,13 +2,36 @@
 LLM Magic - Custom Jupyter magic for LLM integration
 """
 
-from .magic import LLMMagic
-from .clients import LLMClientBase, OpenAIClient, ClaudeClient
-from .bridge import IPythonBridge
+import importlib
 
 __version__ = "0.1.0"
 __all__ = ["LLMMagic", "LLMClientBase", "OpenAIClient", "ClaudeClient", "IPythonBridge"]
 
+# Public names are resolved on first access so that importing the package
+# (e.g. via %load_ext) does not pull in rich, requests and httpx up front.
+_LAZY_ATTRS = {
+    "LLMMagic": ".magic",
+    "LLMClientBase": ".clients",
+    "OpenAIClient": ".clients",
+    "ClaudeClient": ".clients",
+    "IPythonBridge": ".bridge",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
 def load_ipython_extension(ipython):
     """Load the LLM magic extension in IPython/Jupyter."""
+    from .magic import LLMMagic
     ipython.register_magics(LLMMagic)
\ No newline at end of file
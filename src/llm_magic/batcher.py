@@ -0,0 +1,151 @@
+"""
+Dynamic micro-batching of concurrent LLM requests.
+"""
+
+import asyncio
+import functools
+from array import array
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+
+class DynamicBatcher:
+    """Coalesce concurrent single-prompt requests into batched calls.
+    
+    Prompts submitted within `max_wait_ms` of each other are collected, up
+    to `max_batch` at a time, and passed to `fn` in a single call. `fn`
+    takes a list of prompts and returns their results in the same order;
+    it may be a plain function (run in a worker thread) or a coroutine
+    function.
+    """
+    
+    def __init__(self, fn: Callable[[List[str]], Any], max_batch: int = 16, max_wait_ms: float = 50,
+                 queue_size: int = 128):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue_size = queue_size
+        # Pending requests as parallel arrays rather than a tuple per request;
+        # submit times are packed C doubles for the flush-deadline check.
+        self._prompts: List[str] = []
+        self._futures: List[asyncio.Future] = []
+        self._submitted = array("d")
+        self._changed: Optional[asyncio.Condition] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatches: Set[asyncio.Task] = set()
+    
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Conditions, futures and tasks belong to one event loop, so start afresh on a new one
+            self._cancel_pending()
+            self._loop = loop
+            self._changed = asyncio.Condition()
+            self._worker = loop.create_task(self._collect())
+    
+    def _cancel_pending(self) -> None:
+        # Cancel rather than drop waiting submitters, which would otherwise hang forever
+        loop = self._loop
+        for future in self._futures:
+            if future.done():
+                continue
+            if loop is asyncio.get_running_loop():
+                future.cancel()
+            elif not loop.is_closed():
+                loop.call_soon_threadsafe(future.cancel)
+        self._prompts.clear()
+        self._futures.clear()
+        del self._submitted[:]
+    
+    async def submit(self, prompt: str) -> Any:
+        """Queue a prompt for the next batch and wait for its result."""
+        self._ensure_worker()
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self._prompts) < self.queue_size)
+            future = self._loop.create_future()
+            self._prompts.append(prompt)
+            self._futures.append(future)
+            self._submitted.append(self._loop.time())
+            self._changed.notify_all()
+        return await future
+    
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self._prompts)
+                
+                # The oldest pending prompt sets the deadline, so a backlog flushes immediately
+                deadline = self._submitted[0] + self.max_wait
+                while len(self._prompts) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                
+                n = min(len(self._prompts), self.max_batch)
+                prompts = self._prompts[:n]
+                futures = self._futures[:n]
+                del self._prompts[:n]
+                del self._futures[:n]
+                del self._submitted[:n]
+                # Wake submitters waiting for queue space
+                self._changed.notify_all()
+            
+            # Dispatch in the background so slow batches don't hold up collection
+            task = loop.create_task(self._dispatch(prompts, futures))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+    
+    async def _dispatch(self, prompts: List[str], futures: List[asyncio.Future]) -> None:
+        try:
+            if asyncio.iscoroutinefunction(self.fn):
+                results = await self.fn(prompts)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(None, self.fn, prompts)
+            if len(results) != len(prompts):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(prompts)} prompts")
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+    
+    async def aclose(self) -> None:
+        """Stop collecting prompts and wait for in-flight batches to finish.
+        
+        Prompts still waiting to be batched are cancelled.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._cancel_pending()
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+
+def batched(max_batch: int = 16, max_wait_ms: float = 50,
+            queue_size: int = 128) -> Callable[[Callable[[List[str]], Any]], Callable[[str], Awaitable[Any]]]:
+    """Turn a function over a list of prompts into a dynamically batched single-prompt coroutine."""
+    def decorator(fn: Callable[[List[str]], Any]) -> Callable[[str], Awaitable[Any]]:
+        batcher = DynamicBatcher(fn, max_batch=max_batch, max_wait_ms=max_wait_ms, queue_size=queue_size)
+        
+        @functools.wraps(fn)
+        async def wrapper(prompt: str) -> Any:
+            return await batcher.submit(prompt)
+        
+        wrapper.batcher = batcher
+        return wrapper
+    
+    return decorator
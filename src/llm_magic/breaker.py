@@ -0,0 +1,111 @@
+"""
+Circuit breaking for LLM provider calls.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple, Type
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures instead of queueing more doomed calls.
+    
+    After `fail_max` consecutive failures the circuit opens and calls are
+    rejected for `reset_timeout` seconds. A single trial call is then let
+    through; its success closes the circuit, its failure reopens it.
+    """
+    
+    def __init__(self, name: str, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+    
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call should not be attempted."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half-open"
+                return
+            
+            if self.state == "half-open":
+                raise CircuitOpenError(f"Circuit open for {self.name}: a trial request is in flight")
+            raise CircuitOpenError(
+                f"Circuit open for {self.name} after {self._failures} consecutive failures; "
+                f"retry in {remaining:.0f}s"
+            )
+    
+    def record_success(self) -> None:
+        """Close the circuit and reset the failure count."""
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+    
+    @contextmanager
+    def guard(self, failure_types: Tuple[Type[BaseException], ...]) -> Iterator[None]:
+        """Run a provider request under the breaker, recording its outcome.
+        
+        Errors of `failure_types` count as failures unless they carry an
+        HTTP response with a non-retryable status (e.g. 400 or 401), which
+        shows the provider is up. Other exceptions count as a success.
+        Interruptions (KeyboardInterrupt, task cancellation, an abandoned
+        stream) say nothing about the provider and are not recorded.
+        """
+        self.before_call()
+        try:
+            yield
+        except failure_types as e:
+            response = getattr(e, "response", None)
+            if response is None or response.status_code == 429 or response.status_code >= 500:
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except Exception:
+            self.record_success()
+            raise
+        except BaseException:
+            self._abandon_trial()
+            raise
+        else:
+            self.record_success()
+    
+    def _abandon_trial(self) -> None:
+        # An interrupted trial proves nothing, so reopen and let the next call try again
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "open"
+    
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit once the limit is reached."""
+        with self._lock:
+            self._failures += 1
+            if self.state == "half-open" or self._failures >= self.fail_max:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+# Model name -> breaker, shared by every client for that model
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Get the shared circuit breaker for a model, creating it on first use."""
+    breaker = _BREAKERS.get(name)
+    if breaker is None:
+        with _BREAKERS_LOCK:
+            breaker = _BREAKERS.setdefault(name, CircuitBreaker(name))
+    return breaker
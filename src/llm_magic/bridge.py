@@ -2,11 +2,58 @@
 IPython bridge for interacting with Jupyter notebook environment.
 """
 
+import heapq
+import io
+import itertools
 import json
-from typing import List, Dict, Any, Optional
+import re
+import reprlib
+from types import ModuleType
+from typing import List, Dict, Any, Iterator, Optional
 from IPython.display import display, HTML, Javascript
 from IPython.core.interactiveshell import InteractiveShell
 
+# Builtin value types that are passed through to the context as-is
+_SCALARS = (int, float, str, bool, type(None))
+_CONTAINERS = (list, tuple, dict, set, frozenset, bytes)
+
+# Containers at least this long are summarised rather than passed through
+_MAX_CONTAINER_LEN = 1024
+
+# Bounded repr used to summarise large values without rendering them in full
+_summary_repr = reprlib.Repr()
+_summary_repr.maxstring = 256
+_summary_repr.maxother = 256
+
+
+# JavaScript that inserts a new cell below the current one; text is a JS string literal
+_INJECT_CELL_JS = (
+    "var cell = Jupyter.notebook.insert_cell_below('{cell_type}');"
+    " cell.set_text({text});"
+    " cell.focus_cell();"
+)
+
+# Content made only of these characters can be embedded in a JS string literal as-is
+_JS_SAFE_TEXT_RE = re.compile(r'[\w =+*/().,:-]*')
+
+
+class _Description(str):
+    """A summary standing in for a value, kept distinct from string variables."""
+    
+    __slots__ = ()
+
+
+def _describe_object(value: Any) -> _Description:
+    """Summarise an arbitrary object on one line without calling its __repr__."""
+    type_name = type(value).__name__
+    try:
+        shape = getattr(value, 'shape', None)
+        if shape is not None:
+            return _Description(f"{type_name}: shape={tuple(shape)}")
+        return _Description(f"{type_name}: len={len(value)}")
+    except Exception:
+        return _Description(type_name)
+
 
 class IPythonBridge:
     """Bridge for interacting with IPython/Jupyter environment."""
@@ -14,19 +61,23 @@ class IPythonBridge:
     def __init__(self, shell: Optional[InteractiveShell] = None):
         self.shell = shell or InteractiveShell.instance()
     
-    def get_previous_cells(self, count: int = 3) -> List[str]:
-        """Get the content of the last N input cells."""
+    def _iter_previous_cells(self, count: int) -> Iterator[str]:
+        """Iterate over the last N input cells without copying the history."""
         try:
             # Get input history from IPython
             in_history = self.shell.user_ns.get("In", [])
             if len(in_history) <= 1:  # Only the current cell exists
-                return []
+                return iter(())
             
-            # Return last 'count' cells, excluding the current one
+            # Last 'count' cells, excluding the current one
             start_idx = max(1, len(in_history) - count - 1)
-            return in_history[start_idx:-1]  # Exclude current cell
+            return itertools.islice(in_history, start_idx, len(in_history) - 1)
         except Exception:
-            return []
+            return iter(())
+    
+    def get_previous_cells(self, count: int = 3) -> List[str]:
+        """Get the content of the last N input cells."""
+        return list(self._iter_previous_cells(count))
     
     def get_previous_outputs(self, count: int = 3) -> List[Any]:
         """Get the output of the last N executed cells."""
@@ -35,8 +86,9 @@ class IPythonBridge:
             if not out_history:
                 return []
             
-            # Get the last 'count' outputs
-            out_keys = sorted(out_history.keys())[-count:]
+            # Get the last 'count' outputs without sorting the whole history
+            out_keys = heapq.nlargest(count, out_history)
+            out_keys.reverse()
             return [out_history[key] for key in out_keys]
         except Exception:
             return []
@@ -47,38 +99,51 @@ class IPythonBridge:
             # Filter out IPython internals and large objects
             filtered_globals = {}
             for key, value in self.shell.user_ns.items():
-                if (not key.startswith('_') and 
-                    not callable(value) and 
-                    not hasattr(value, '__module__')):
-                    try:
-                        # Try to serialize to check if it's a simple type
-                        json.dumps(value, default=str)
+                if key.startswith('_'):
+                    continue
+                
+                if isinstance(value, _SCALARS):
+                    filtered_globals[key] = value
+                elif isinstance(value, _CONTAINERS):
+                    if len(value) < _MAX_CONTAINER_LEN:
                         filtered_globals[key] = value
-                    except (TypeError, ValueError):
-                        # For complex objects, just store their type and string representation
-                        filtered_globals[key] = f"{type(value).__name__}: {str(value)[:100]}..."
+                    else:
+                        # For large containers, just store their type and a bounded representation
+                        filtered_globals[key] = _Description(f"{type(value).__name__}: {_summary_repr.repr(value)}")
+                elif not callable(value) and not isinstance(value, ModuleType):
+                    # Data objects (DataFrames, arrays, ...) are described by type and size only
+                    filtered_globals[key] = _describe_object(value)
             
             return filtered_globals
         except Exception:
             return {}
     
-    def get_variable_summary(self, max_vars: int = 10) -> str:
-        """Get a summary of current variables for context."""
+    def _write_variable_summary(self, buf: io.StringIO, max_vars: int = 10) -> bool:
+        """Write a summary of current variables to buf; return False if there are none."""
         globals_dict = self.get_globals()
         if not globals_dict:
-            return "No variables defined."
+            return False
         
         # Limit to most recent variables
         var_items = list(globals_dict.items())[-max_vars:]
         
-        summary_lines = ["Current variables:"]
+        buf.write("Current variables:")
         for key, value in var_items:
-            if isinstance(value, (int, float, str, bool)):
-                summary_lines.append(f"  {key} = {repr(value)}")
+            if isinstance(value, _Description):
+                buf.write(f"\n  {key} = {value}")
+            elif isinstance(value, (int, float, str, bool)):
+                buf.write(f"\n  {key} = {_summary_repr.repr(value)}")
             else:
-                summary_lines.append(f"  {key} = {type(value).__name__}")
+                buf.write(f"\n  {key} = {type(value).__name__}")
         
-        return "\n".join(summary_lines)
+        return True
+    
+    def get_variable_summary(self, max_vars: int = 10) -> str:
+        """Get a summary of current variables for context."""
+        buf = io.StringIO()
+        if not self._write_variable_summary(buf, max_vars):
+            return "No variables defined."
+        return buf.getvalue()
     
     def run_code(self, code: str) -> Any:
         """Execute code in the current notebook context."""
@@ -89,12 +154,12 @@ class IPythonBridge:
     
     def inject_new_cell(self, content: str, cell_type: str = "code") -> None:
         """Inject a new cell below the current one."""
-        # JavaScript to create a new cell
-        js_code = f"""
-        var cell = Jupyter.notebook.insert_cell_below('{cell_type}');
-        cell.set_text({json.dumps(content)});
-        cell.focus_cell();
-        """
+        # Only escape the content when it contains characters that need it
+        if _JS_SAFE_TEXT_RE.fullmatch(content):
+            text = f'"{content}"'
+        else:
+            text = json.dumps(content)
+        js_code = _INJECT_CELL_JS.format(cell_type=cell_type, text=text)
         
         try:
             display(Javascript(js_code))
@@ -114,29 +179,31 @@ class IPythonBridge:
     
     def build_context_prompt(self, user_prompt: str, context_cells: int = 3, include_variables: bool = True) -> str:
         """Build a comprehensive prompt including context from the notebook."""
-        context_parts = []
+        # Nothing to gather: skip the history and namespace walks entirely
+        if context_cells <= 0 and not include_variables:
+            return f"Current request:\n{user_prompt}"
+        
+        buf = io.StringIO()
         
         # Add previous cells context
         if context_cells > 0:
-            prev_cells = self.get_previous_cells(context_cells)
-            if prev_cells:
-                context_parts.append("Previous notebook cells:")
-                for i, cell in enumerate(prev_cells, 1):
-                    context_parts.append(f"Cell {i}:\n{cell}")
-                context_parts.append("")
+            cell_count = 0
+            for cell_count, cell in enumerate(self._iter_previous_cells(context_cells), 1):
+                if cell_count == 1:
+                    buf.write("Previous notebook cells:\n")
+                buf.write(f"Cell {cell_count}:\n{cell}\n")
+            if cell_count:
+                buf.write("\n")
         
         # Add variable context
-        if include_variables:
-            var_summary = self.get_variable_summary()
-            if var_summary != "No variables defined.":
-                context_parts.append(var_summary)
-                context_parts.append("")
+        if include_variables and self._write_variable_summary(buf):
+            buf.write("\n\n")
         
         # Add the main prompt
-        context_parts.append("Current request:")
-        context_parts.append(user_prompt)
+        buf.write("Current request:\n")
+        buf.write(user_prompt)
         
-        return "\n".join(context_parts)
+        return buf.getvalue()
     
     def get_cell_execution_count(self) -> Optional[int]:
         """Get the execution count of the current cell."""
@@ -0,0 +1,286 @@
+"""
+Response caching for LLM Magic.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+
+def request_key(model: str, prompt: str, temperature: float, max_tokens: Optional[int] = None,
+                tools: Any = None, system: Optional[str] = None) -> str:
+    """Build a cache key from everything that determines a response.
+    
+    Shared by LLMCache and the %%llm magic so both layers use one key scheme.
+    """
+    raw = json.dumps({
+        "model": model,
+        "prompt": prompt,
+        "temperature": float(temperature),
+        "max_tokens": max_tokens,
+        "tools": tools,
+        "system": system
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class ResponseCache:
+    """In-memory LRU cache of LLM responses with optional expiry."""
+    
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Optional[float], str]]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, marking it as recently used."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, response = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return response
+    
+    def set(self, key: str, response: str, ttl: Optional[float] = None) -> None:
+        """Cache a response for `ttl` seconds (forever if None), evicting the LRU entry if full."""
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Cache backend storing responses in Redis, shared across processes."""
+    
+    def __init__(self, client: Any = None, url: str = "redis://localhost:6379/0", prefix: str = "llm_magic:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("RedisBackend requires the 'redis' package. Install it with: pip install redis")
+            client = redis.Redis.from_url(url)
+        
+        self.client = client
+        self.prefix = prefix
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, or None if missing or expired."""
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+    
+    def set(self, key: str, response: str, ttl: Optional[float] = None) -> None:
+        """Cache a response, letting Redis expire it after `ttl` seconds."""
+        self.client.set(self.prefix + key, response, ex=int(ttl) if ttl is not None else None)
+    
+    def clear(self) -> None:
+        """Remove all responses stored under this backend's prefix."""
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class LLMCache:
+    """Cache of deterministic (temperature 0) responses, shared by LLM clients."""
+    
+    def __init__(self, backend: Any = None, ttl: Optional[float] = 3600):
+        self.backend = backend if backend is not None else ResponseCache(max_size=1024)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+    
+    def key(self, model: str, prompt: str, temperature: float, max_tokens: Optional[int] = None,
+            tools: Any = None, system: Optional[str] = None) -> Optional[str]:
+        """Build a cache key, or return None if the call is not deterministic."""
+        if temperature != 0:
+            return None
+        return request_key(model, prompt, temperature, max_tokens, tools, system)
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response, counting the hit or miss."""
+        response = self.backend.get(key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+    
+    def set(self, key: str, response: str) -> None:
+        """Cache a response for the configured TTL."""
+        self.backend.set(key, response, ttl=self.ttl)
+    
+    def clear(self) -> None:
+        """Remove all cached responses and reset the statistics."""
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class _SemanticKey(NamedTuple):
+    exact: str
+    scope: str
+    prompt: str
+
+
+class _EmbeddingIndex:
+    """Fixed-size ring of normalized prompt embeddings and their responses."""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors = None
+        self._expires = None
+        self._responses: list = []
+        self._next = 0
+    
+    def add(self, vector, response: str, expires_at: float) -> None:
+        import numpy as np
+        
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self._expires = np.zeros(self.max_entries, dtype=np.float64)
+        
+        slot = self._next % self.max_entries
+        self._vectors[slot] = vector
+        self._expires[slot] = expires_at
+        if slot < len(self._responses):
+            self._responses[slot] = response
+        else:
+            self._responses.append(response)
+        self._next += 1
+    
+    def nearest(self, vector, now: float) -> Tuple[float, Optional[str]]:
+        """Return the best cosine similarity and its response among live entries."""
+        import numpy as np
+        
+        count = len(self._responses)
+        if count == 0:
+            return -1.0, None
+        
+        sims = self._vectors[:count] @ vector
+        sims[self._expires[:count] <= now] = -np.inf
+        best = int(sims.argmax())
+        return float(sims[best]), self._responses[best]
+
+
+class SemanticCache(LLMCache):
+    """LLMCache that also answers near-duplicate prompts by embedding similarity.
+    
+    Requires numpy and sentence-transformers unless a custom `encoder` is given.
+    The encoder maps a list of prompts to an array of L2-normalized embeddings.
+    """
+    
+    def __init__(self, backend: Any = None, ttl: Optional[float] = 3600, threshold: float = 0.92,
+                 model_name: str = "all-MiniLM-L6-v2", max_entries: int = 1024,
+                 encoder: Optional[Callable[[Sequence[str]], Any]] = None):
+        super().__init__(backend, ttl)
+        self.threshold = threshold
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.semantic_hits = 0
+        self._encoder = encoder
+        self._indexes: Dict[str, _EmbeddingIndex] = {}
+        # Async clients look up and fill the cache from worker threads
+        self._lock = threading.Lock()
+        # A miss is usually followed by set() for the same prompt, so keep its embedding
+        self._last_encoded: Optional[Tuple[str, Any]] = None
+    
+    def _encode(self, prompt: str):
+        last = self._last_encoded
+        if last is not None and last[0] == prompt:
+            return last[1]
+        
+        encoder = self._encoder
+        if encoder is None:
+            encoder = self._load_encoder()
+        vector = encoder([prompt])[0]
+        self._last_encoded = (prompt, vector)
+        return vector
+    
+    def _load_encoder(self) -> Callable[[Sequence[str]], Any]:
+        # Concurrent first lookups from worker threads must load the model only once
+        with self._lock:
+            if self._encoder is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError:
+                    raise ImportError(
+                        "SemanticCache requires the 'sentence-transformers' package. "
+                        "Install it with: pip install sentence-transformers"
+                    )
+                model = SentenceTransformer(self.model_name)
+                self._encoder = partial(model.encode, normalize_embeddings=True)
+            return self._encoder
+    
+    def key(self, model: str, prompt: str, temperature: float, max_tokens: Optional[int] = None,
+            tools: Any = None, system: Optional[str] = None) -> Optional[_SemanticKey]:
+        """Build a cache key that also carries the prompt for similarity lookup."""
+        exact = super().key(model, prompt, temperature, max_tokens, tools, system)
+        if exact is None:
+            return None
+        # Only prompts sent with the same model and parameters are comparable
+        scope = super().key(model, "", temperature, max_tokens, tools, system)
+        return _SemanticKey(exact, scope, prompt)
+    
+    def get(self, key: _SemanticKey) -> Optional[str]:
+        """Get an exact match, falling back to the most similar cached prompt."""
+        response = self.backend.get(key.exact)
+        if response is None:
+            if key.scope in self._indexes:
+                vector = self._encode(key.prompt)
+                # Hold the lock so a concurrent add() can't pair a new vector with an old response
+                with self._lock:
+                    index = self._indexes.get(key.scope)
+                    similarity, candidate = index.nearest(vector, time.monotonic()) if index is not None else (-1.0, None)
+                if similarity >= self.threshold:
+                    response = candidate
+                    self.semantic_hits += 1
+        
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+    
+    def set(self, key: _SemanticKey, response: str) -> None:
+        """Cache a response under its exact key and index its prompt embedding."""
+        self.backend.set(key.exact, response, ttl=self.ttl)
+        
+        vector = self._encode(key.prompt)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            index = self._indexes.get(key.scope)
+            if index is None:
+                index = self._indexes[key.scope] = _EmbeddingIndex(self.max_entries)
+            index.add(vector, response, expires_at)
+    
+    def clear(self) -> None:
+        """Remove all cached responses and embeddings and reset the statistics."""
+        super().clear()
+        with self._lock:
+            self._indexes.clear()
+        self.semantic_hits = 0
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "semantic_hits": self.semantic_hits}
@@ -2,69 +2,501 @@
 LLM client implementations for various providers.
 """
 
+import asyncio
+import importlib.util
+import inspect
 import os
+import random
+import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
-import requests
-import json
+from email.utils import parsedate_to_datetime
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterable, Iterator, List, Tuple, Type
+
+from . import _json
+from .batcher import DynamicBatcher
+from .breaker import get_breaker
+from .cache import LLMCache, SemanticCache
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+
+class ProviderStreamError(Exception):
+    """Raised when a provider reports an error part-way through a stream."""
+
+
+# Retry policy shared by the sync session and the async request path
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 429 and 503 mean the request was rejected unprocessed; after a 500, 502 or 504
+# the provider may already have run it, so replaying a POST could bill it (or
+# submit a batch job) twice
+_POST_RETRY_STATUSES = (429, 503)
+_MAX_RETRIES = 5
+_BACKOFF_FACTOR = 0.25
+# Random extra delay per retry, so a burst of rejected calls doesn't retry in lockstep
+_BACKOFF_JITTER = 0.5
+
+
+@lru_cache(maxsize=None)
+def _get_session() -> "requests.Session":
+    """Get the shared session, importing requests on first use.
+    
+    Consecutive calls to the same endpoint reuse pooled keep-alive
+    connections instead of paying a TCP+TLS handshake each time.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    class _Retry(Retry):
+        # status_forcelist applies to every method, so narrow it for POSTs here
+        def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+            if method == "POST" and status_code not in _POST_RETRY_STATUSES:
+                return False
+            return super().is_retry(method, status_code, has_retry_after)
+    
+    # backoff_jitter was added in urllib3 2.0
+    jitter = {"backoff_jitter": _BACKOFF_JITTER} if "backoff_jitter" in inspect.signature(Retry).parameters else {}
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=64,
+        max_retries=_Retry(
+            total=_MAX_RETRIES,
+            backoff_factor=_BACKOFF_FACTOR,
+            **jitter,
+            # Never replay a POST after a read error or timeout: the provider
+            # may already be generating (and billing) the first attempt
+            read=0,
+            status_forcelist=_RETRY_STATUSES,
+            allowed_methods=["GET", "POST"],
+            respect_retry_after_header=True
+        )
+    ))
+    return session
+
+
+# httpx connections are bound to the event loop that opened them, so the
+# shared async client is kept per loop rather than as a single global.
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_ASYNC_CLIENTS_LOCK = threading.Lock()
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """Get the shared async HTTP client for the running event loop."""
+    import httpx
+    
+    loop = asyncio.get_running_loop()
+    with _ASYNC_CLIENTS_LOCK:
+        client = _ASYNC_CLIENTS.get(loop)
+        if client is None or client.is_closed:
+            # HTTP/2 multiplexes concurrent requests (e.g. gather_prompts) over
+            # one connection per host; it needs the optional h2 package.
+            client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                timeout=60,
+                limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+            )
+            _ASYNC_CLIENTS[loop] = client
+        return client
+
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    """Seconds to wait before retry number `attempt` (from 0), honouring Retry-After."""
+    jitter = random.random() * _BACKOFF_JITTER
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after)) + jitter
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()) + jitter
+            except (TypeError, ValueError):
+                pass
+    return _BACKOFF_FACTOR * (2 ** attempt) + jitter
+
+
+async def _apost(url: str, headers: Dict[str, str], content: bytes) -> "httpx.Response":
+    """POST on the shared async client, retrying connection failures, 429 and 503 with backoff.
+    
+    Mirrors the sync session's Retry: a request that may have reached the
+    provider (read error or timeout) is never replayed.
+    """
+    import httpx
+    
+    for attempt in range(_MAX_RETRIES + 1):
+        try:
+            response = await get_async_client().post(url, headers=headers, content=content)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if attempt == _MAX_RETRIES:
+                raise
+            await asyncio.sleep(_retry_delay(attempt, None))
+            continue
+        
+        if response.status_code not in _POST_RETRY_STATUSES or attempt == _MAX_RETRIES:
+            return response
+        await asyncio.sleep(_retry_delay(attempt, response.headers.get("Retry-After")))
+
+
+# Provider name -> environment variable holding its API key
+_ENV_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "claude": "ANTHROPIC_API_KEY",
+}
+
+
+def _iter_sse_data(response: "requests.Response") -> Iterator[bytes]:
+    """Yield the payload of each ``data:`` line of a server-sent event stream."""
+    for line in response.iter_lines():
+        if line.startswith(b"data:"):
+            yield line[5:].strip()
+
+
+def _iter_jsonl(response: "requests.Response") -> Iterator[Dict[str, Any]]:
+    """Yield each record of a JSON Lines response."""
+    for line in response.iter_lines():
+        if line.strip():
+            yield _json.loads(line)
+
+
+def _batch_error_message(record: Dict[str, Any]) -> str:
+    """Describe why a single OpenAI batch request failed."""
+    response = record.get("response") or {}
+    error = record.get("error") or (response.get("body") or {}).get("error") or {}
+    return error.get("message") or f"HTTP {response.get('status_code')}"
 
 
 class LLMClientBase(ABC):
     """Abstract base class for LLM clients."""
     
+    # Clients are built per key/model, so skip the per-instance __dict__
+    __slots__ = ("api_key", "model")
+    
+    # Optional cache of deterministic responses, set per client
+    cache: Optional[LLMCache] = None
+    
     @abstractmethod
     def call_model(self, prompt: str, **kwargs) -> str:
         """Call the LLM with the given prompt and return the response."""
         pass
     
+    async def acall_model(self, prompt: str, **kwargs) -> str:
+        """Call the LLM without blocking the event loop.
+        
+        Subclasses should override this with a native async implementation;
+        the default runs call_model in a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.call_model, prompt, **kwargs))
+    
+    async def gather_prompts(self, prompts: Iterable[str], concurrency: int = 16, **kwargs) -> List[str]:
+        """Call the LLM for many prompts with at most `concurrency` requests in flight.
+        
+        Responses are returned in the same order as the prompts.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def call_one(prompt: str) -> str:
+            async with semaphore:
+                return await self.acall_model(prompt, **kwargs)
+        
+        return await asyncio.gather(*(call_one(prompt) for prompt in prompts))
+    
+    def batch_call(self, prompts: Iterable[str], **kwargs) -> List[str]:
+        """Call the LLM for many prompts, returning responses in prompt order.
+        
+        Subclasses should override this with the provider's batch API;
+        the default calls call_model once per prompt.
+        """
+        return [self.call_model(prompt, **kwargs) for prompt in prompts]
+    
+    def call_model_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Yield the response in chunks as it is generated.
+        
+        Subclasses should override this with a native streaming implementation;
+        the default yields the full call_model response as a single chunk.
+        """
+        yield self.call_model(prompt, **kwargs)
+    
     @abstractmethod
     def get_model_name(self) -> str:
         """Return the name of the model being used."""
         pass
+    
+    def _cache_key(self, prompt: str, max_tokens: int, temperature: float, **kwargs) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.key(
+            self.get_model_name(), prompt, temperature, max_tokens, kwargs.get("tools"), kwargs.get("system")
+        )
+    
+    async def _acache_get(self, cache_key: Any) -> Optional[str]:
+        # Semantic lookups run the embedding model, so keep them off the event loop
+        if isinstance(self.cache, SemanticCache):
+            return await asyncio.get_running_loop().run_in_executor(None, self.cache.get, cache_key)
+        return self.cache.get(cache_key)
+    
+    async def _acache_set(self, cache_key: Any, response: str) -> None:
+        if isinstance(self.cache, SemanticCache):
+            await asyncio.get_running_loop().run_in_executor(None, self.cache.set, cache_key, response)
+        else:
+            self.cache.set(cache_key, response)
+    
+    def _stream_through_cache(self, cache_key: Optional[str], chunks: Iterator[str]) -> Iterator[str]:
+        """Yield a cached response whole, or stream `chunks` and cache them once fully read."""
+        if cache_key is None:
+            yield from chunks
+            return
+        
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.cache.set(cache_key, "".join(parts).strip())
+    
+    @property
+    def cache_stats(self) -> Dict[str, int]:
+        """Return cache hit and miss counts for this client."""
+        if self.cache is None:
+            return {"hits": 0, "misses": 0}
+        return self.cache.stats
 
 
 class OpenAIClient(LLMClientBase):
     """OpenAI API client implementation."""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4"):
-        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+    __slots__ = ("cache", "base_url", "_headers", "_url", "_payload_base")
+    
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4", cache: Optional[LLMCache] = None,
+                 semantic_cache: bool = False):
+        self.api_key = api_key or os.environ.get(_ENV_KEYS["openai"])
         self.model = model
+        self.cache = SemanticCache() if cache is None and semantic_cache else cache
         self.base_url = "https://api.openai.com/v1"
         
         if not self.api_key:
-            raise ValueError("OpenAI API key not provided. Set OPENAI_API_KEY environment variable.")
-    
-    def call_model(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> str:
-        """Call OpenAI's API with the given prompt."""
-        headers = {
+            raise ValueError(f"OpenAI API key not provided. Set {_ENV_KEYS['openai']} environment variable.")
+        
+        # Headers, URL and payload fields are constant for the client's lifetime, so build them once
+        self._headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
-        data = {
-            "model": self.model,
+        self._url = f"{self.base_url}/chat/completions"
+        self._payload_base = {"model": self.model}
+    
+    def _build_payload(self, prompt: str, max_tokens: int, temperature: float,
+                       prompt_cache_key: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        payload = {
+            **self._payload_base,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
             "temperature": temperature
         }
+        if prompt_cache_key:
+            # Routes requests sharing a prefix to the same prompt cache
+            payload["prompt_cache_key"] = prompt_cache_key
+        return payload
+    
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        return result["choices"][0]["message"]["content"].strip()
+    
+    def call_model(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> str:
+        """Call OpenAI's API with the given prompt."""
+        import requests
+        
+        cache_key = self._cache_key(prompt, max_tokens, temperature, **kwargs)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
+            with get_breaker(self.get_model_name()).guard((requests.exceptions.RequestException,)):
+                response = _get_session().post(
+                    self._url,
+                    headers=self._headers,
+                    data=_json.dumps(self._build_payload(prompt, max_tokens, temperature, **kwargs)),
+                    timeout=60
+                )
+                response.raise_for_status()
+            
+            content = self._parse_response(_json.loads(response.content))
+            
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"OpenAI API error: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Unexpected OpenAI API response format: {e}")
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return content
+    
+    def call_model_stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> Iterator[str]:
+        """Stream OpenAI's response token by token."""
+        return self._stream_through_cache(
+            self._cache_key(prompt, max_tokens, temperature, **kwargs),
+            self._stream(prompt, max_tokens, temperature, **kwargs)
+        )
+    
+    def _stream(self, prompt: str, max_tokens: int, temperature: float, **kwargs) -> Iterator[str]:
+        import requests
+        
+        payload = self._build_payload(prompt, max_tokens, temperature, **kwargs)
+        payload["stream"] = True
+        
+        try:
+            with get_breaker(self.get_model_name()).guard((requests.exceptions.RequestException,)):
+                with _get_session().post(
+                    self._url,
+                    headers=self._headers,
+                    data=_json.dumps(payload),
+                    timeout=60,
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    
+                    for data in _iter_sse_data(response):
+                        if data == b"[DONE]":
+                            break
+                        choices = _json.loads(data).get("choices")
+                        if choices:
+                            content = choices[0]["delta"].get("content")
+                            if content:
+                                yield content
+                                
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"OpenAI API error: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Unexpected OpenAI API response format: {e}")
+    
+    async def acall_model(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> str:
+        """Call OpenAI's API asynchronously over the shared connection pool."""
+        import httpx
+        
+        cache_key = self._cache_key(prompt, max_tokens, temperature, **kwargs)
+        if cache_key is not None:
+            cached = await self._acache_get(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            with get_breaker(self.get_model_name()).guard((httpx.HTTPError,)):
+                # Retries happen inside, so the breaker only sees the final outcome
+                response = await _apost(
+                    self._url,
+                    self._headers,
+                    _json.dumps(self._build_payload(prompt, max_tokens, temperature, **kwargs))
+                )
+                response.raise_for_status()
+            
+            content = self._parse_response(_json.loads(response.content))
+            
+        except httpx.HTTPError as e:
+            raise Exception(f"OpenAI API error: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Unexpected OpenAI API response format: {e}")
+        
+        if cache_key is not None:
+            await self._acache_set(cache_key, content)
+        return content
+    
+    def batch_call(self, prompts: Iterable[str], max_tokens: int = 2000, temperature: float = 0.7,
+                   poll_interval: float = 5.0, **kwargs) -> List[str]:
+        """Run prompts through OpenAI's Batch API at reduced cost and wait for the results."""
+        import requests
+        
+        lines = [
+            _json.dumps({
+                "custom_id": f"i-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._build_payload(prompt, max_tokens, temperature, **kwargs)
+            })
+            for i, prompt in enumerate(prompts)
+        ]
+        if not lines:
+            return []
+        
+        # File uploads are multipart, so they must not send the JSON content type
+        auth_headers = {"Authorization": self._headers["Authorization"]}
+        
+        try:
+            response = _get_session().post(
+                f"{self.base_url}/files",
+                headers=auth_headers,
+                data={"purpose": "batch"},
+                files={"file": ("batch.jsonl", b"\n".join(lines))},
                 timeout=60
             )
             response.raise_for_status()
             
-            result = response.json()
-            return result["choices"][0]["message"]["content"].strip()
+            response = _get_session().post(
+                f"{self.base_url}/batches",
+                headers=self._headers,
+                data=_json.dumps({
+                    "input_file_id": _json.loads(response.content)["id"],
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h"
+                }),
+                timeout=60
+            )
+            response.raise_for_status()
+            batch = _json.loads(response.content)
+            
+            while batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(poll_interval)
+                response = _get_session().get(f"{self.base_url}/batches/{batch['id']}", headers=self._headers, timeout=60)
+                response.raise_for_status()
+                batch = _json.loads(response.content)
+            
+            if batch["status"] != "completed":
+                raise Exception(f"OpenAI API error: batch {batch['id']} {batch['status']}")
+            
+            # Requests that failed are written to a separate error file, not the output file
+            if batch.get("error_file_id"):
+                failures = [
+                    f"{record['custom_id']}: {_batch_error_message(record)}"
+                    for record in self._iter_file(batch["error_file_id"], auth_headers)
+                ]
+                if failures:
+                    raise Exception(f"OpenAI API error: batch {batch['id']} requests failed: {'; '.join(failures)}")
+            if not batch.get("output_file_id"):
+                raise Exception(f"OpenAI API error: batch {batch['id']} completed without an output file")
+            
+            results = {}
+            for record in self._iter_file(batch["output_file_id"], auth_headers):
+                if record.get("error"):
+                    raise Exception(f"OpenAI API error: {record['custom_id']} failed: {_batch_error_message(record)}")
+                results[record["custom_id"]] = self._parse_response(record["response"]["body"])
+            
+            return [results[f"i-{i}"] for i in range(len(lines))]
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"OpenAI API error: {e}")
-        except (KeyError, IndexError) as e:
+        except (KeyError, IndexError, ValueError) as e:
             raise Exception(f"Unexpected OpenAI API response format: {e}")
     
+    def _iter_file(self, file_id: str, auth_headers: Dict[str, str]) -> Iterator[Dict[str, Any]]:
+        """Stream the JSON Lines records of an uploaded or generated file."""
+        with _get_session().get(
+            f"{self.base_url}/files/{file_id}/content",
+            headers=auth_headers,
+            timeout=60,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            yield from _iter_jsonl(response)
+    
     def get_model_name(self) -> str:
         return f"openai/{self.model}"
 
@@ -72,44 +504,190 @@ class OpenAIClient(LLMClientBase):
 class ClaudeClient(LLMClientBase):
     """Anthropic Claude API client implementation."""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "claude-3-sonnet-20240229"):
-        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    __slots__ = ("cache", "base_url", "_headers", "_url", "_payload_base")
+    
+    def __init__(self, api_key: Optional[str] = None, model: str = "claude-3-sonnet-20240229", cache: Optional[LLMCache] = None,
+                 semantic_cache: bool = False):
+        self.api_key = api_key or os.environ.get(_ENV_KEYS["claude"])
         self.model = model
+        self.cache = SemanticCache() if cache is None and semantic_cache else cache
         self.base_url = "https://api.anthropic.com/v1"
         
         if not self.api_key:
-            raise ValueError("Anthropic API key not provided. Set ANTHROPIC_API_KEY environment variable.")
-    
-    def call_model(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> str:
-        """Call Anthropic's API with the given prompt."""
-        headers = {
+            raise ValueError(f"Anthropic API key not provided. Set {_ENV_KEYS['claude']} environment variable.")
+        
+        # Headers, URL and payload fields are constant for the client's lifetime, so build them once
+        self._headers = {
             "x-api-key": self.api_key,
             "Content-Type": "application/json",
             "anthropic-version": "2023-06-01"
         }
-        
-        data = {
-            "model": self.model,
+        self._url = f"{self.base_url}/messages"
+        self._payload_base = {"model": self.model}
+    
+    def _build_payload(self, prompt: str, max_tokens: int, temperature: float,
+                       system: Optional[str] = None, cache_system: bool = False, **kwargs) -> Dict[str, Any]:
+        payload = {
+            **self._payload_base,
             "max_tokens": max_tokens,
             "temperature": temperature,
             "messages": [{"role": "user", "content": prompt}]
         }
+        if system:
+            if cache_system:
+                # Lets Anthropic reuse the processed system prompt across calls
+                payload["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+            else:
+                payload["system"] = system
+        return payload
+    
+    def _parse_response(self, result: Dict[str, Any]) -> str:
+        return result["content"][0]["text"].strip()
+    
+    def call_model(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> str:
+        """Call Anthropic's API with the given prompt."""
+        import requests
+        
+        cache_key = self._cache_key(prompt, max_tokens, temperature, **kwargs)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         try:
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=headers,
-                json=data,
+            with get_breaker(self.get_model_name()).guard((requests.exceptions.RequestException,)):
+                response = _get_session().post(
+                    self._url,
+                    headers=self._headers,
+                    data=_json.dumps(self._build_payload(prompt, max_tokens, temperature, **kwargs)),
+                    timeout=60
+                )
+                response.raise_for_status()
+            
+            content = self._parse_response(_json.loads(response.content))
+            
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Anthropic API error: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Unexpected Anthropic API response format: {e}")
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return content
+    
+    def call_model_stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> Iterator[str]:
+        """Stream Anthropic's response token by token."""
+        return self._stream_through_cache(
+            self._cache_key(prompt, max_tokens, temperature, **kwargs),
+            self._stream(prompt, max_tokens, temperature, **kwargs)
+        )
+    
+    def _stream(self, prompt: str, max_tokens: int, temperature: float, **kwargs) -> Iterator[str]:
+        import requests
+        
+        payload = self._build_payload(prompt, max_tokens, temperature, **kwargs)
+        payload["stream"] = True
+        
+        try:
+            with get_breaker(self.get_model_name()).guard((requests.exceptions.RequestException, ProviderStreamError)):
+                with _get_session().post(
+                    self._url,
+                    headers=self._headers,
+                    data=_json.dumps(payload),
+                    timeout=60,
+                    stream=True
+                ) as response:
+                    response.raise_for_status()
+                    
+                    for data in _iter_sse_data(response):
+                        event = _json.loads(data)
+                        if event["type"] == "content_block_delta":
+                            text = event["delta"].get("text")
+                            if text:
+                                yield text
+                        elif event["type"] == "message_stop":
+                            break
+                        elif event["type"] == "error":
+                            raise ProviderStreamError(f"Anthropic API error: {event['error'].get('message')}")
+                            
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Anthropic API error: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Unexpected Anthropic API response format: {e}")
+    
+    async def acall_model(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.7, **kwargs) -> str:
+        """Call Anthropic's API asynchronously over the shared connection pool."""
+        import httpx
+        
+        cache_key = self._cache_key(prompt, max_tokens, temperature, **kwargs)
+        if cache_key is not None:
+            cached = await self._acache_get(cache_key)
+            if cached is not None:
+                return cached
+        
+        try:
+            with get_breaker(self.get_model_name()).guard((httpx.HTTPError,)):
+                # Retries happen inside, so the breaker only sees the final outcome
+                response = await _apost(
+                    self._url,
+                    self._headers,
+                    _json.dumps(self._build_payload(prompt, max_tokens, temperature, **kwargs))
+                )
+                response.raise_for_status()
+            
+            content = self._parse_response(_json.loads(response.content))
+            
+        except httpx.HTTPError as e:
+            raise Exception(f"Anthropic API error: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            raise Exception(f"Unexpected Anthropic API response format: {e}")
+        
+        if cache_key is not None:
+            await self._acache_set(cache_key, content)
+        return content
+    
+    def batch_call(self, prompts: Iterable[str], max_tokens: int = 2000, temperature: float = 0.7,
+                   poll_interval: float = 5.0, **kwargs) -> List[str]:
+        """Run prompts through Anthropic's Message Batches API at reduced cost and wait for the results."""
+        import requests
+        
+        batch_requests = [
+            {"custom_id": f"i-{i}", "params": self._build_payload(prompt, max_tokens, temperature, **kwargs)}
+            for i, prompt in enumerate(prompts)
+        ]
+        if not batch_requests:
+            return []
+        
+        try:
+            response = _get_session().post(
+                f"{self.base_url}/messages/batches",
+                headers=self._headers,
+                data=_json.dumps({"requests": batch_requests}),
                 timeout=60
             )
             response.raise_for_status()
+            batch = _json.loads(response.content)
+            
+            while batch["processing_status"] != "ended":
+                time.sleep(poll_interval)
+                response = _get_session().get(f"{self.base_url}/messages/batches/{batch['id']}", headers=self._headers, timeout=60)
+                response.raise_for_status()
+                batch = _json.loads(response.content)
             
-            result = response.json()
-            return result["content"][0]["text"].strip()
+            results = {}
+            with _get_session().get(batch["results_url"], headers=self._headers, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                for record in _iter_jsonl(response):
+                    result = record["result"]
+                    if result["type"] != "succeeded":
+                        raise Exception(f"Anthropic API error: {record['custom_id']} {result['type']}")
+                    results[record["custom_id"]] = self._parse_response(result["message"])
+            
+            return [results[f"i-{i}"] for i in range(len(batch_requests))]
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Anthropic API error: {e}")
-        except (KeyError, IndexError) as e:
+        except (KeyError, IndexError, ValueError) as e:
             raise Exception(f"Unexpected Anthropic API response format: {e}")
     
     def get_model_name(self) -> str:
@@ -119,17 +697,43 @@ class ClaudeClient(LLMClientBase):
 class ClientFactory:
     """Factory for creating LLM clients."""
     
-    @staticmethod
-    def create_client(provider: str, **kwargs) -> LLMClientBase:
+    # Provider name -> client class, used for dispatch and validation
+    _REGISTRY: Dict[str, Type[LLMClientBase]] = {
+        "openai": OpenAIClient,
+        "claude": ClaudeClient,
+    }
+    
+    @classmethod
+    def create_client(cls, provider: str, **kwargs) -> LLMClientBase:
         """Create an LLM client for the specified provider."""
-        if provider.lower() == "openai":
-            return OpenAIClient(**kwargs)
-        elif provider.lower() == "claude":
-            return ClaudeClient(**kwargs)
-        else:
+        # Registered names are lowercase, so exact matches skip the lower() copy
+        registry = cls._REGISTRY
+        client_cls = registry.get(provider) or registry.get(provider.lower())
+        if client_cls is None:
             raise ValueError(f"Unsupported LLM provider: {provider}")
+        return client_cls(**kwargs)
+    
+    @classmethod
+    def create_batcher(cls, provider: str, max_batch: int = 16, max_wait_ms: float = 50, **kwargs) -> DynamicBatcher:
+        """Create a client and merge concurrent prompts into calls to its batch_call."""
+        client = cls.create_client(provider, **kwargs)
+        return DynamicBatcher(client.batch_call, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    
+    @classmethod
+    def register(cls, name: str, client_cls: Type[LLMClientBase]) -> None:
+        """Register a client class under a provider name."""
+        if not (isinstance(client_cls, type) and issubclass(client_cls, LLMClientBase)):
+            raise TypeError(f"{client_cls!r} is not an LLMClientBase subclass")
+        cls._REGISTRY[name.lower()] = client_cls
+    
+    @classmethod
+    def get_available_providers(cls) -> Tuple[str, ...]:
+        """Get the names of the available LLM providers."""
+        return tuple(cls._REGISTRY)
     
-    @staticmethod
-    def get_available_providers() -> list:
-        """Get list of available LLM providers."""
-        return ["openai", "claude"]
\ No newline at end of file
+    @classmethod
+    def close(cls) -> None:
+        """Close the pooled connections shared by all sync clients."""
+        if _get_session.cache_info().currsize:
+            _get_session().close()
+            _get_session.cache_clear()
\ No newline at end of file
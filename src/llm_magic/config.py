@@ -3,14 +3,17 @@ Configuration management for LLM Magic.
 """
 
 import os
-import yaml
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 from pathlib import Path
 
 
 class ConfigManager:
     """Manages configuration for LLM Magic."""
     
+    # Parsed config files shared across instances, keyed by path and
+    # validated against the file's modification time
+    _file_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    
     def __init__(self, config_file: Optional[str] = None):
         self.config_file = config_file or self._get_default_config_path()
         self._config: Dict[str, Any] = {}
@@ -35,15 +38,14 @@ class ConfigManager:
             'max_tokens': 2000,
             'temperature': 0.7,
             'log_requests': False,
-            'log_file': None
+            'log_file': None,
+            'cache_size': 128
         }
         
         # Load from file if it exists
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r') as f:
-                    file_config = yaml.safe_load(f) or {}
-                self._config.update(file_config)
+                self._config.update(self._read_config_file())
             except Exception as e:
                 print(f"Warning: Could not load config file {self.config_file}: {e}")
         
@@ -56,13 +58,29 @@ class ConfigManager:
         }
         
         for env_var, config_key in env_mappings.items():
-            if os.getenv(env_var):
-                value = os.getenv(env_var)
+            value = os.environ.get(env_var)
+            if value:
                 # Convert string boolean values
                 if value.lower() in ('true', 'false'):
                     value = value.lower() == 'true'
                 self._config[config_key] = value
     
+    def _read_config_file(self) -> Dict[str, Any]:
+        """Parse the config file, reusing the cached result if it is unchanged."""
+        mtime_ns = os.stat(self.config_file).st_mtime_ns
+        cached = self._file_cache.get(self.config_file)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        
+        import yaml
+        # Prefer the C-accelerated loader when libyaml is available
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        with open(self.config_file, 'r') as f:
+            file_config = yaml.load(f, Loader=loader) or {}
+        
+        self._file_cache[self.config_file] = (mtime_ns, file_config)
+        return file_config
+    
     def get(self, key: str, default: Any = None) -> Any:
         """Get a configuration value."""
         return self._config.get(key, default)
@@ -77,6 +95,7 @@ class ConfigManager:
             config_dir = Path(self.config_file).parent
             config_dir.mkdir(exist_ok=True)
             
+            import yaml
             with open(self.config_file, 'w') as f:
                 yaml.dump(self._config, f, default_flow_style=False)
         except Exception as e:
@@ -97,5 +116,6 @@ class ConfigManager:
             'max_tokens': 2000,
             'temperature': 0.7,
             'log_requests': False,
-            'log_file': None
+            'log_file': None,
+            'cache_size': 128
         }
\ No newline at end of file
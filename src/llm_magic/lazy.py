@@ -0,0 +1,23 @@
+"""
+Lazy registration of the LLM magics.
+
+Loading this extension only records which module provides ``%%llm`` and
+``%%llm_config``; IPython imports and registers the full extension the
+first time one of them is run.
+"""
+
+_MAGIC_NAMES = ("llm", "llm_config")
+
+
+def load_ipython_extension(ipython):
+    """Register the LLM magics to be loaded on first use."""
+    magics_manager = ipython.magics_manager
+    
+    # lazy_magics is only available in newer IPython releases
+    if not magics_manager.has_trait("lazy_magics"):
+        from . import load_ipython_extension as load_extension
+        load_extension(ipython)
+        return
+    
+    for name in _MAGIC_NAMES:
+        magics_manager.lazy_magics[name] = "llm_magic"
\ No newline at end of file
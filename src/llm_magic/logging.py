@@ -2,12 +2,62 @@
 Logging functionality for LLM Magic.
 """
 
-import json
+import atexit
 import os
+import queue
+import re
+import threading
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 
+from . import _json
+
+# Entries from every LLMLogger are written by one background thread, which
+# batches whatever has queued up into a single write per log file
+_write_queue: "queue.Queue[Tuple[LLMLogger, bytes]]" = queue.Queue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _start_writer() -> None:
+    """Start the shared writer thread if it is not running yet."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_drain, name="llm-magic-logger", daemon=True)
+            _writer.start()
+            # Write out anything still queued before the interpreter exits
+            atexit.register(_write_queue.join)
+
+
+def _drain() -> None:
+    """Write queued log lines for as long as the process runs."""
+    while True:
+        # Batches are handled in a separate frame so their loggers aren't kept
+        # alive while the thread waits for the next entry
+        _write_batch()
+
+
+def _write_batch() -> None:
+    """Wait for queued log lines and write them to their loggers' files."""
+    batch = [_write_queue.get()]
+    while True:
+        try:
+            batch.append(_write_queue.get_nowait())
+        except queue.Empty:
+            break
+    
+    lines_by_logger: Dict[LLMLogger, List[bytes]] = {}
+    for logger, line in batch:
+        lines_by_logger.setdefault(logger, []).append(line)
+    try:
+        for logger, lines in lines_by_logger.items():
+            logger._write(lines)
+    finally:
+        for _ in batch:
+            _write_queue.task_done()
+
 
 class LLMLogger:
     """Logger for LLM requests and responses."""
@@ -16,6 +66,10 @@ class LLMLogger:
         self.enabled = enabled
         self.log_file = log_file or self._get_default_log_path()
         self._ensure_log_directory()
+        
+        # Kept open by the shared writer thread between batches
+        self._file = None
+        self._file_lock = threading.Lock()
     
     def _get_default_log_path(self) -> str:
         """Get the default log file path."""
@@ -33,6 +87,29 @@ class LLMLogger:
             log_dir = Path(self.log_file).parent
             log_dir.mkdir(parents=True, exist_ok=True)
     
+    def _write(self, lines: List[bytes]) -> None:
+        """Append lines to the log file, opening it if needed."""
+        try:
+            with self._file_lock:
+                if self._file is None:
+                    self._file = open(self.log_file, 'ab')
+                self._file.write(b''.join(line + b'\n' for line in lines))
+                self._file.flush()
+        except Exception as e:
+            print(f"Warning: Could not write to log file: {e}")
+    
+    def flush(self) -> None:
+        """Block until all queued log entries have been written."""
+        _write_queue.join()
+    
+    def close(self) -> None:
+        """Flush pending entries and close the log file."""
+        self.flush()
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+    
     def log_request(self, 
                    provider: str,
                    model: str,
@@ -54,23 +131,21 @@ class LLMLogger:
             "metadata": metadata or {}
         }
         
-        try:
-            with open(self.log_file, 'a') as f:
-                f.write(json.dumps(log_entry) + '\n')
-        except Exception as e:
-            print(f"Warning: Could not write to log file: {e}")
+        _start_writer()
+        _write_queue.put((self, _json.dumps(log_entry)))
     
     def get_recent_logs(self, count: int = 10) -> list:
         """Get recent log entries."""
+        self.flush()
         if not os.path.exists(self.log_file):
             return []
         
         try:
             logs = []
-            with open(self.log_file, 'r') as f:
+            with open(self.log_file, 'rb') as f:
                 for line in f:
                     if line.strip():
-                        logs.append(json.loads(line))
+                        logs.append(_json.loads(line))
             
             return logs[-count:] if logs else []
         except Exception as e:
@@ -80,34 +155,55 @@ class LLMLogger:
     def clear_logs(self) -> None:
         """Clear all log entries."""
         try:
+            self.close()
             if os.path.exists(self.log_file):
                 os.remove(self.log_file)
         except Exception as e:
             print(f"Warning: Could not clear log file: {e}")
 
 
+# Patterns flagged in prompts (case-insensitively) and operations flagged in code
+_DANGEROUS_PROMPT_PATTERNS = [
+    'rm -rf',
+    'sudo',
+    'chmod',
+    'eval(',
+    'exec(',
+    '__import__',
+]
+
+_DANGEROUS_CODE_OPERATIONS = [
+    'os.system',
+    'subprocess.call',
+    'subprocess.run',
+    'eval(',
+    'exec(',
+    '__import__',
+    'open(',
+    'file(',
+]
+
+
 class SecurityValidator:
     """Validates and sanitizes inputs for security."""
     
+    # Each pattern list is scanned in a single pass by one compiled alternation
+    _PROMPT_RE = re.compile('|'.join(map(re.escape, _DANGEROUS_PROMPT_PATTERNS)), re.IGNORECASE)
+    _CODE_RE = re.compile('|'.join(map(re.escape, _DANGEROUS_CODE_OPERATIONS)))
+    
+    @staticmethod
+    def _find_patterns(regex: "re.Pattern[str]", text: str) -> List[str]:
+        """Return each distinct pattern found in text, in order of appearance."""
+        return list(dict.fromkeys(match.group().lower() for match in regex.finditer(text)))
+    
     @staticmethod
     def sanitize_prompt(prompt: str) -> str:
         """Sanitize prompt to remove potential security issues."""
         # Remove potential command injection patterns
-        dangerous_patterns = [
-            'rm -rf',
-            'sudo',
-            'chmod',
-            'eval(',
-            'exec(',
-            '__import__',
-        ]
-        
-        sanitized = prompt
-        for pattern in dangerous_patterns:
-            if pattern in sanitized.lower():
-                print(f"Warning: Potentially dangerous pattern '{pattern}' detected in prompt")
+        for pattern in SecurityValidator._find_patterns(SecurityValidator._PROMPT_RE, prompt):
+            print(f"Warning: Potentially dangerous pattern '{pattern}' detected in prompt")
         
-        return sanitized
+        return prompt
     
     @staticmethod
     def validate_api_key(api_key: str, provider: str) -> bool:
@@ -126,19 +222,7 @@ class SecurityValidator:
     def sanitize_code_execution(code: str) -> str:
         """Sanitize code before execution."""
         # Remove potentially dangerous operations
-        dangerous_operations = [
-            'os.system',
-            'subprocess.call',
-            'subprocess.run',
-            'eval(',
-            'exec(',
-            '__import__',
-            'open(',
-            'file(',
-        ]
-        
-        for operation in dangerous_operations:
-            if operation in code:
-                print(f"Warning: Potentially dangerous operation '{operation}' detected in code")
+        for operation in SecurityValidator._find_patterns(SecurityValidator._CODE_RE, code):
+            print(f"Warning: Potentially dangerous operation '{operation}' detected in code")
         
         return code
\ No newline at end of file
@@ -3,17 +3,65 @@ Custom IPython magic for LLM integration.
 """
 
 import argparse
+import asyncio
 import os
-from typing import Optional, Dict, Any
+import re
+import threading
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterable, List
 from IPython.core.magic import Magics, magics_class, cell_magic
 from IPython.core.magic_arguments import argument, magic_arguments, parse_argstring
-from rich.console import Console
-from rich.panel import Panel
-from rich.syntax import Syntax
 
 from .clients import ClientFactory, LLMClientBase
 from .bridge import IPythonBridge
 from .config import ConfigManager
+from .cache import LLMCache, ResponseCache, request_key
+
+if TYPE_CHECKING:
+    from rich.console import Console
+    from rich.panel import Panel
+
+
+# Fenced code blocks (```language\ncode\n```) and inline `code` spans
+_CODE_BLOCK_RE = re.compile(r'```(?:\w+)?\n(.*?)\n```', re.DOTALL)
+_INLINE_CODE_RE = re.compile(r'`([^`]+)`')
+
+_console: Optional["Console"] = None
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_console() -> "Console":
+    """Get the rich console shared by all LLMMagic instances."""
+    global _console
+    if _console is None:
+        from rich.console import Console
+        # Output is model text and plain status lines: don't parse [markup]
+        # or run the auto-highlighting regexes over every printed string
+        _console = Console(highlight=False, markup=False)
+    return _console
+
+
+def _run_coroutine(coro):
+    """Run a coroutine to completion on the magic's background event loop.
+    
+    IPython kernels already run an event loop on the main thread, so async
+    client calls go to a long-lived loop in a daemon thread. Reusing one loop
+    also lets the shared async HTTP client keep its connections between cells.
+    If the wait is interrupted (e.g. the user stops the cell), the coroutine is
+    cancelled rather than left running on the background loop.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-magic-loop", daemon=True).start()
+    future = asyncio.run_coroutine_threadsafe(coro, _loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
 
 
 @magics_class
@@ -23,10 +71,17 @@ class LLMMagic(Magics):
     def __init__(self, shell=None):
         super().__init__(shell)
         self.bridge = IPythonBridge(shell)
-        self.config = ConfigManager()
-        self.console = Console()
+        self.config_manager = ConfigManager()
+        # Unlike a client's LLMCache, --cache also keeps responses at temperature > 0,
+        # so entries are keyed with request_key() directly rather than LLMCache.key()
+        self._response_cache = LLMCache(ResponseCache(self.config_manager.get('cache_size', 128)), ttl=None)
         self._clients: Dict[str, LLMClientBase] = {}
     
+    @property
+    def console(self) -> "Console":
+        """Rich console, created on first use to keep extension loading fast."""
+        return _get_console()
+    
     def _get_client(self, provider: str, model: Optional[str] = None) -> LLMClientBase:
         """Get or create an LLM client for the specified provider."""
         client_key = f"{provider}:{model or 'default'}"
@@ -43,7 +98,7 @@ class LLMMagic(Magics):
     @cell_magic
     @magic_arguments()
     @argument('--provider', '-p', default='openai', 
-              help='LLM provider (openai, claude)')
+              help='LLM provider (openai, claude); comma-separate several to compare them')
     @argument('--model', '-m', default=None,
               help='Specific model to use')
     @argument('--context', '-c', type=int, default=3,
@@ -60,6 +115,12 @@ class LLMMagic(Magics):
               help='Maximum tokens in response')
     @argument('--raw', action='store_true',
               help='Return raw response without formatting')
+    @argument('--no-stream', action='store_true',
+              help='Wait for the full response instead of streaming it')
+    @argument('--cache', action='store_true',
+              help='Reuse cached responses even when temperature is above 0')
+    @argument('--no-cache', action='store_true',
+              help='Always call the LLM, bypassing the response cache')
     def llm(self, line: str, cell: str):
         """
         %%llm magic command for LLM integration.
@@ -73,18 +134,33 @@ class LLMMagic(Magics):
         
         %%llm --context 5 --inject
         Refactor the above code for better performance
+        
+        %%llm --provider openai,claude
+        Compare answers from several providers, queried in parallel
         """
         try:
             # Parse arguments
             args = parse_argstring(self.llm, line)
             
-            # Validate provider
-            if args.provider not in ClientFactory.get_available_providers():
-                available = ", ".join(ClientFactory.get_available_providers())
-                raise ValueError(f"Invalid provider '{args.provider}'. Available: {available}")
+            # Validate providers
+            providers = [p.strip().lower() for p in args.provider.split(",") if p.strip()]
+            available_providers = ClientFactory.get_available_providers()
+            for provider in providers:
+                if provider not in available_providers:
+                    available = ", ".join(available_providers)
+                    raise ValueError(f"Invalid provider '{provider}'. Available: {available}")
+            if not providers:
+                raise ValueError("No provider specified")
             
-            # Get or create client
-            client = self._get_client(args.provider, args.model)
+            if len(providers) > 1:
+                if args.model:
+                    raise ValueError("--model can only be used with a single provider")
+                if args.execute or args.inject:
+                    raise ValueError("--exec and --inject require a single provider")
+            
+            # Get or create clients
+            clients = [self._get_client(provider, args.model) for provider in providers]
+            client = clients[0]
             
             # Build context prompt
             include_variables = not args.no_variables
@@ -95,21 +171,58 @@ class LLMMagic(Magics):
             )
             
             # Display what we're sending to the LLM (in debug mode)
-            if self.config.get('debug', False):
+            if self.config_manager.get('debug', False):
+                from rich.panel import Panel
                 self.console.print(Panel(
                     full_prompt,
-                    title=f"Prompt to {client.get_model_name()}",
+                    title=f"Prompt to {', '.join(c.get_model_name() for c in clients)}",
                     border_style="blue"
                 ))
             
-            # Call the LLM
-            self.console.print(f"🤖 Calling {client.get_model_name()}...")
+            # Responses are only cached by default when they are deterministic
+            use_cache = not args.no_cache and (args.cache or args.temperature == 0)
             
-            response = client.call_model(
-                full_prompt,
-                temperature=args.temperature,
-                max_tokens=args.max_tokens
-            )
+            if len(clients) > 1:
+                self._compare_responses(clients, full_prompt, args, use_cache)
+                return
+            
+            cache_key = None
+            response = None
+            if use_cache:
+                cache_key = request_key(
+                    client.get_model_name(), full_prompt, args.temperature, args.max_tokens
+                )
+                response = self._response_cache.get(cache_key)
+            
+            if response is not None:
+                self.console.print(f"♻️ Using cached response from {client.get_model_name()}")
+            else:
+                # Call the LLM
+                self.console.print(f"🤖 Calling {client.get_model_name()}...")
+                
+                # Stream straight to the output unless the full text is needed first
+                streaming = not (args.execute or args.inject or args.no_stream)
+                if streaming:
+                    chunks = client.call_model_stream(
+                        full_prompt,
+                        temperature=args.temperature,
+                        max_tokens=args.max_tokens
+                    )
+                    if args.raw:
+                        response = self._stream_raw_response(chunks)
+                    else:
+                        response = self._stream_formatted_response(chunks, client.get_model_name())
+                else:
+                    response = client.call_model(
+                        full_prompt,
+                        temperature=args.temperature,
+                        max_tokens=args.max_tokens
+                    )
+                
+                if use_cache:
+                    self._response_cache.set(cache_key, response)
+                if streaming:
+                    return
             
             # Handle the response based on flags
             if args.execute:
@@ -124,6 +237,48 @@ class LLMMagic(Magics):
         except Exception as e:
             self.console.print(f"❌ Error: {e}", style="red")
     
+    def _compare_responses(self, clients: List[LLMClientBase], full_prompt: str,
+                           args: argparse.Namespace, use_cache: bool) -> None:
+        """Query several LLMs concurrently and display each response."""
+        cache_keys = [
+            request_key(c.get_model_name(), full_prompt, args.temperature, args.max_tokens)
+            if use_cache else None
+            for c in clients
+        ]
+        responses: List[Any] = [
+            self._response_cache.get(key) if key else None for key in cache_keys
+        ]
+        pending = [i for i, response in enumerate(responses) if response is None]
+        
+        if pending:
+            names = ", ".join(clients[i].get_model_name() for i in pending)
+            self.console.print(f"🤖 Calling {names}...")
+            
+            async def gather():
+                return await asyncio.gather(*(
+                    clients[i].acall_model(
+                        full_prompt,
+                        temperature=args.temperature,
+                        max_tokens=args.max_tokens
+                    )
+                    for i in pending
+                ), return_exceptions=True)
+            
+            for i, result in zip(pending, _run_coroutine(gather())):
+                responses[i] = result
+                if use_cache and not isinstance(result, BaseException):
+                    self._response_cache.set(cache_keys[i], result)
+        
+        for client, response in zip(clients, responses):
+            model_name = client.get_model_name()
+            if isinstance(response, BaseException):
+                self.console.print(f"❌ Error from {model_name}: {response}", style="red")
+            elif args.raw:
+                print(f"--- Response from {model_name} ---")
+                print(response)
+            else:
+                self._display_formatted_response(response, model_name)
+    
     def _execute_response(self, response: str) -> None:
         """Execute the LLM response as code."""
         try:
@@ -163,25 +318,59 @@ class LLMMagic(Magics):
             # Fallback: display the response
             self._display_formatted_response(response, "LLM Response")
     
-    def _display_formatted_response(self, response: str, model_name: str) -> None:
-        """Display the LLM response with rich formatting."""
-        try:
-            # Try to detect if the response contains code
-            if self._contains_code_blocks(response):
-                # Display as syntax-highlighted markdown
-                syntax = Syntax(response, "markdown", theme="github-dark", line_numbers=False)
-                self.console.print(Panel(
-                    syntax,
-                    title=f"Response from {model_name}",
-                    border_style="green"
-                ))
-            else:
-                # Display as plain text
-                self.console.print(Panel(
-                    response,
+    def _format_response(self, response: str, model_name: str) -> "Panel":
+        """Build the rich panel used to display an LLM response."""
+        from rich.panel import Panel
+        from rich.syntax import Syntax
+        
+        # Try to detect if the response contains code
+        if self._contains_code_blocks(response):
+            # Display as syntax-highlighted markdown
+            body = Syntax(response, "markdown", theme="github-dark", line_numbers=False)
+        else:
+            # Display as plain text
+            body = response
+        
+        return Panel(
+            body,
+            title=f"Response from {model_name}",
+            border_style="green"
+        )
+    
+    def _stream_raw_response(self, chunks: Iterable[str]) -> str:
+        """Print a streamed LLM response as plain text as chunks arrive."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            print(chunk, end="", flush=True)
+        print()
+        return "".join(parts)
+    
+    def _stream_formatted_response(self, chunks: Iterable[str], model_name: str) -> str:
+        """Render a streamed LLM response live as chunks arrive."""
+        from rich.live import Live
+        from rich.panel import Panel
+        
+        parts = []
+        with Live(self._format_response("", model_name), console=self.console,
+                  refresh_per_second=8) as live:
+            for chunk in chunks:
+                parts.append(chunk)
+                live.update(Panel(
+                    "".join(parts),
                     title=f"Response from {model_name}",
                     border_style="green"
                 ))
+            
+            response = "".join(parts)
+            live.update(self._format_response(response, model_name))
+        
+        return response
+    
+    def _display_formatted_response(self, response: str, model_name: str) -> None:
+        """Display the LLM response with rich formatting."""
+        try:
+            self.console.print(self._format_response(response, model_name))
                 
         except Exception:
             # Fallback to simple display
@@ -191,18 +380,14 @@ class LLMMagic(Magics):
     
     def _extract_code_blocks(self, text: str) -> str:
         """Extract code blocks from markdown-formatted text."""
-        import re
-        
         # Find code blocks (```language\ncode\n```)
-        code_pattern = r'```(?:\w+)?\n(.*?)\n```'
-        matches = re.findall(code_pattern, text, re.DOTALL)
+        matches = _CODE_BLOCK_RE.findall(text)
         
         if matches:
             return '\n\n'.join(matches)
         
         # If no code blocks found, look for inline code
-        inline_pattern = r'`([^`]+)`'
-        inline_matches = re.findall(inline_pattern, text)
+        inline_matches = _INLINE_CODE_RE.findall(text)
         
         if inline_matches and len(inline_matches) == 1:
             return inline_matches[0]
@@ -211,7 +396,8 @@ class LLMMagic(Magics):
     
     def _contains_code_blocks(self, text: str) -> bool:
         """Check if text contains code blocks."""
-        return '```' in text or text.count('`') >= 2
+        # Two or more backticks means the first and last occurrences differ
+        return '```' in text or text.find('`') != text.rfind('`')
     
     @cell_magic
     def llm_config(self, line: str, cell: str):
@@ -228,7 +414,7 @@ class LLMMagic(Magics):
             config_data = yaml.safe_load(cell)
             
             for key, value in config_data.items():
-                self.config.set(key, value)
+                self.config_manager.set(key, value)
             
             self.console.print("✅ Configuration updated", style="green")
             self.console.print("Current config:", style="blue")
@@ -0,0 +1,67 @@
+"""
+Shared fixtures for llm_magic tests.
+"""
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+import responses
+
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+ANTHROPIC_MESSAGES_URL = "https://api.anthropic.com/v1/messages"
+
+
+class FakeResp:
+    """Lightweight stand-in for an HTTP response, cheaper to build than a Mock."""
+    
+    __slots__ = ("content", "status_code", "_lines")
+    
+    def __init__(self, data=None, status_code=200, lines=()):
+        self.content = json.dumps(data).encode()
+        self.status_code = status_code
+        self._lines = list(lines)
+    
+    def json(self):
+        return json.loads(self.content)
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error")
+    
+    def iter_lines(self):
+        return iter(self._lines)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    """Give every test its own circuit breakers so failures don't leak between tests."""
+    monkeypatch.setattr("llm_magic.breaker._BREAKERS", {})
+
+
+@pytest.fixture
+def mocked_llm():
+    """Answer provider API requests with canned responses at the transport level."""
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+        rsps.add(responses.POST, OPENAI_CHAT_URL, json={
+            "choices": [{"message": {"content": "Hello, world!"}}]
+        })
+        rsps.add(responses.POST, ANTHROPIC_MESSAGES_URL, json={
+            "content": [{"text": "Hello from Claude!"}]
+        })
+        yield rsps
+
+
+@pytest.fixture
+def mock_session(monkeypatch):
+    """Replace the shared requests session with a MagicMock."""
+    session = MagicMock()
+    monkeypatch.setattr("llm_magic.clients._get_session", lambda: session)
+    return session
@@ -0,0 +1,99 @@
+"""
+Tests for dynamic micro-batching.
+"""
+
+import asyncio
+
+from llm_magic.batcher import DynamicBatcher, batched
+
+
+class TestDynamicBatcher:
+    """Test coalescing of concurrent requests."""
+    
+    def test_concurrent_prompts_share_one_call(self):
+        """Test that prompts submitted together are sent as one batch."""
+        calls = []
+        
+        def fn(prompts):
+            calls.append(prompts)
+            return [p.upper() for p in prompts]
+        
+        async def run():
+            batcher = DynamicBatcher(fn, max_batch=16, max_wait_ms=20)
+            results = await asyncio.gather(*(batcher.submit(p) for p in ["a", "b", "c"]))
+            await batcher.aclose()
+            return results
+        
+        assert asyncio.run(run()) == ["A", "B", "C"]
+        assert calls == [["a", "b", "c"]]
+    
+    def test_max_batch_splits_calls(self):
+        """Test that batches never exceed max_batch prompts."""
+        calls = []
+        
+        async def fn(prompts):
+            calls.append(prompts)
+            return prompts
+        
+        async def run():
+            batcher = DynamicBatcher(fn, max_batch=2, max_wait_ms=20)
+            results = await asyncio.gather(*(batcher.submit(p) for p in ["a", "b", "c"]))
+            await batcher.aclose()
+            return results
+        
+        assert asyncio.run(run()) == ["a", "b", "c"]
+        assert calls == [["a", "b"], ["c"]]
+    
+    def test_queue_size_applies_backpressure(self):
+        """Test that submitters wait for space instead of overfilling the queue."""
+        max_pending = 0
+        
+        async def fn(prompts):
+            nonlocal max_pending
+            max_pending = max(max_pending, len(batcher._prompts))
+            await asyncio.sleep(0.001)
+            return prompts
+        
+        async def run():
+            results = await asyncio.gather(*(batcher.submit(str(i)) for i in range(10)))
+            await batcher.aclose()
+            return results
+        
+        batcher = DynamicBatcher(fn, max_batch=2, max_wait_ms=1, queue_size=3)
+        assert asyncio.run(run()) == [str(i) for i in range(10)]
+        assert max_pending <= 3
+    
+    def test_errors_reach_every_caller(self):
+        """Test that a failed batch call fails each waiting request."""
+        @batched(max_wait_ms=1)
+        def fn(prompts):
+            raise RuntimeError("API down")
+        
+        async def run():
+            results = await asyncio.gather(fn("a"), fn("b"), return_exceptions=True)
+            await fn.batcher.aclose()
+            return results
+        
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+    
+    def test_restart_cancels_orphaned_requests(self):
+        """Test that requests queued for a dead worker are cancelled rather than left hanging."""
+        async def fn(prompts):
+            return prompts
+        
+        async def run():
+            batcher = DynamicBatcher(fn, max_wait_ms=10_000)
+            orphan = asyncio.ensure_future(batcher.submit("a"))
+            await asyncio.sleep(0.01)
+            batcher._worker.cancel()
+            await asyncio.gather(batcher._worker, return_exceptions=True)
+            
+            submitted = asyncio.ensure_future(batcher.submit("b"))
+            results = await asyncio.wait_for(asyncio.gather(orphan, return_exceptions=True), 1)
+            submitted.cancel()
+            await batcher.aclose()
+            return results
+        
+        results = asyncio.run(run())
+        assert isinstance(results[0], asyncio.CancelledError)
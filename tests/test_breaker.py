@@ -0,0 +1,76 @@
+"""
+Tests for the provider circuit breaker.
+"""
+
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+
+from llm_magic.breaker import CircuitBreaker, CircuitOpenError
+
+
+class TestCircuitBreaker:
+    """Test opening, rejecting and recovering."""
+    
+    def fail(self, breaker, error=None):
+        with pytest.raises(ConnectionError):
+            with breaker.guard((ConnectionError,)):
+                raise error or ConnectionError("down")
+    
+    def test_opens_after_fail_max(self):
+        """Test that consecutive failures open the circuit."""
+        breaker = CircuitBreaker("openai/gpt-4", fail_max=3)
+        for _ in range(3):
+            self.fail(breaker)
+        
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+    
+    def test_client_errors_do_not_count(self):
+        """Test that a 4xx response is not treated as an outage."""
+        breaker = CircuitBreaker("openai/gpt-4", fail_max=1)
+        error = ConnectionError("bad request")
+        error.response = Mock(status_code=400)
+        self.fail(breaker, error)
+        
+        assert breaker.state == "closed"
+    
+    def test_trial_call_after_timeout(self):
+        """Test that a successful trial call closes the circuit."""
+        breaker = CircuitBreaker("openai/gpt-4", fail_max=1, reset_timeout=30)
+        with patch("llm_magic.breaker.time.monotonic", return_value=100.0):
+            self.fail(breaker)
+        
+        with patch("llm_magic.breaker.time.monotonic", return_value=131.0):
+            with breaker.guard((ConnectionError,)):
+                assert breaker.state == "half-open"
+                with pytest.raises(CircuitOpenError):
+                    breaker.before_call()
+        
+        assert breaker.state == "closed"
+    
+    def test_interrupt_does_not_reset_failures(self):
+        """Test that a KeyboardInterrupt is not recorded as a success."""
+        breaker = CircuitBreaker("openai/gpt-4", fail_max=2)
+        self.fail(breaker)
+        with pytest.raises(KeyboardInterrupt):
+            with breaker.guard((ConnectionError,)):
+                raise KeyboardInterrupt
+        
+        self.fail(breaker)
+        assert breaker.state == "open"
+    
+    def test_cancelled_trial_reopens(self):
+        """Test that a cancelled trial call leaves the circuit open."""
+        breaker = CircuitBreaker("openai/gpt-4", fail_max=1, reset_timeout=30)
+        with patch("llm_magic.breaker.time.monotonic", return_value=100.0):
+            self.fail(breaker)
+        
+        with patch("llm_magic.breaker.time.monotonic", return_value=131.0):
+            with pytest.raises(asyncio.CancelledError):
+                with breaker.guard((ConnectionError,)):
+                    raise asyncio.CancelledError
+        
+        assert breaker.state == "open"
@@ -0,0 +1,132 @@
+"""
+Tests for the IPython bridge.
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from llm_magic.bridge import IPythonBridge
+
+
+@pytest.fixture
+def make_bridge():
+    """Build a bridge over a fake shell with the given user namespace."""
+    def _make(**user_ns):
+        return IPythonBridge(shell=SimpleNamespace(user_ns=user_ns))
+    return _make
+
+
+class TestVariableSummary:
+    """Test the variable summary written into the context prompt."""
+    
+    def test_scalars(self, make_bridge):
+        """Test that scalars are written with their repr."""
+        bridge = make_bridge(n=3, name="alice", flag=True)
+        
+        assert bridge.get_variable_summary() == (
+            "Current variables:\n  n = 3\n  name = 'alice'\n  flag = True"
+        )
+    
+    def test_long_string_is_truncated(self, make_bridge):
+        """Test that a long string is not written to the prompt in full."""
+        bridge = make_bridge(text="x" * 100_000)
+        
+        summary = bridge.get_variable_summary()
+        assert len(summary) < 400
+        assert "..." in summary
+    
+    def test_descriptions_unquoted(self, make_bridge):
+        """Test that summarised objects are not rendered like string variables."""
+        bridge = make_bridge(df=SimpleNamespace(shape=(3, 4)), label="DataFrame")
+        
+        assert bridge.get_variable_summary() == (
+            "Current variables:\n  df = SimpleNamespace: shape=(3, 4)\n  label = 'DataFrame'"
+        )
+    
+    def test_no_variables(self, make_bridge):
+        """Test the placeholder for an empty namespace."""
+        assert make_bridge(_hidden=1).get_variable_summary() == "No variables defined."
+
+
+class TestGetGlobals:
+    """Test how namespace values are classified."""
+    
+    def test_classification(self, make_bridge):
+        """Test that scalars and small containers pass through and other objects are described."""
+        small, large = [1, 2], list(range(2000))
+        globals_dict = make_bridge(
+            n=1, s="text", none=None, small=small, large=large, arr=SimpleNamespace(shape=[2, 2]),
+            func=len, cls=dict, mod=json, _private=1
+        ).get_globals()
+        
+        assert list(globals_dict) == ["n", "s", "none", "small", "large", "arr"]
+        assert globals_dict["s"] == "text" and type(globals_dict["s"]) is str
+        assert globals_dict["small"] is small
+        assert globals_dict["large"].startswith("list: [0, 1, 2")
+        assert type(globals_dict["large"]) is not str
+        assert globals_dict["arr"] == "SimpleNamespace: shape=(2, 2)"
+
+
+class TestBuildContextPrompt:
+    """Test the assembled context prompt."""
+    
+    def test_full_prompt(self, make_bridge):
+        """Test the exact layout of cells, variables and request."""
+        bridge = make_bridge(In=["", "a = 1", "b = a + 1", "%llm ask"], a=1)
+        
+        assert bridge.build_context_prompt("Explain b", context_cells=2) == (
+            "Previous notebook cells:\n"
+            "Cell 1:\na = 1\n"
+            "Cell 2:\nb = a + 1\n"
+            "\n"
+            "Current variables:\n  In = list\n  a = 1\n"
+            "\n"
+            "Current request:\nExplain b"
+        )
+    
+    def test_no_cells_or_variables(self, make_bridge):
+        """Test a prompt with nothing to add but the request."""
+        bridge = make_bridge(In=[""])
+        
+        assert bridge.build_context_prompt("Hi", include_variables=False) == "Current request:\nHi"
+    
+    def test_early_return_skips_namespace(self):
+        """Test that no history or namespace is read when neither is wanted."""
+        shell = Mock()
+        bridge = IPythonBridge(shell=shell)
+        
+        assert bridge.build_context_prompt("Hi", context_cells=0, include_variables=False) == "Current request:\nHi"
+        assert shell.mock_calls == []
+
+
+class TestInjectNewCell:
+    """Test building the JavaScript that inserts a new cell."""
+    
+    def injected_text(self, make_bridge, content):
+        with patch("llm_magic.bridge.display") as mock_display, \
+                patch("llm_magic.bridge.Javascript", side_effect=lambda code: code):
+            make_bridge().inject_new_cell(content)
+        js_code = mock_display.call_args.args[0]
+        return js_code[js_code.index("cell.set_text(") + len("cell.set_text("):js_code.index("); cell.focus_cell")]
+    
+    def test_safe_text_embedded_verbatim(self, make_bridge):
+        """Test that text without special characters is quoted as-is."""
+        assert self.injected_text(make_bridge, "df = load(path)") == '"df = load(path)"'
+    
+    @pytest.mark.parametrize("content", [
+        'print("hi")',
+        "path = 'C:\\\\tmp'",
+        "a = 1\nb = 2",
+        "html = '</script>'",
+        "s = 'line\u2028break'",
+    ])
+    def test_special_characters_escaped(self, make_bridge, content):
+        """Test that quotes, backslashes, newlines, </script> and U+2028 go through json.dumps."""
+        text = self.injected_text(make_bridge, content)
+        
+        assert text == json.dumps(content)
+        assert json.loads(text) == content
+        assert "\n" not in text and "\u2028" not in text
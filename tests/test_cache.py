@@ -0,0 +1,146 @@
+"""
+Tests for the response cache.
+"""
+
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from llm_magic.cache import LLMCache, ResponseCache, SemanticCache, request_key
+
+
+class TestResponseCache:
+    """Test the in-memory LRU response cache."""
+    
+    def test_request_key_is_deterministic(self):
+        """Test that identical requests map to the same key."""
+        key1 = request_key("openai/gpt-4", "prompt", 0.0, 2000)
+        key2 = request_key("openai/gpt-4", "prompt", 0.0, 2000)
+        assert key1 == key2
+    
+    def test_request_key_varies_with_parameters(self):
+        """Test that any request parameter change yields a new key."""
+        base = request_key("openai/gpt-4", "prompt", 0.0, 2000)
+        assert base != request_key("claude/claude-3", "prompt", 0.0, 2000)
+        assert base != request_key("openai/gpt-4", "other", 0.0, 2000)
+        assert base != request_key("openai/gpt-4", "prompt", 0.5, 2000)
+        assert base != request_key("openai/gpt-4", "prompt", 0.0, 100)
+    
+    def test_get_missing_key(self):
+        """Test that a miss returns None."""
+        cache = ResponseCache()
+        assert cache.get("missing") is None
+    
+    def test_evicts_least_recently_used(self):
+        """Test LRU eviction once the cache is full."""
+        cache = ResponseCache(max_size=2)
+        cache.set("a", "response a")
+        cache.set("b", "response b")
+        cache.get("a")
+        cache.set("c", "response c")
+        
+        assert len(cache) == 2
+        assert cache.get("a") == "response a"
+        assert cache.get("b") is None
+        assert cache.get("c") == "response c"
+    
+    def test_expires_after_ttl(self):
+        """Test that entries past their TTL are treated as misses."""
+        cache = ResponseCache()
+        with patch("llm_magic.cache.time.monotonic", return_value=100.0):
+            cache.set("a", "response a", ttl=10)
+        with patch("llm_magic.cache.time.monotonic", return_value=105.0):
+            assert cache.get("a") == "response a"
+        with patch("llm_magic.cache.time.monotonic", return_value=111.0):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestLLMCache:
+    """Test the deterministic-response cache used by clients."""
+    
+    def test_key_only_for_zero_temperature(self):
+        """Test that sampled calls are never cached."""
+        cache = LLMCache()
+        assert cache.key("openai/gpt-4", "prompt", 0.7) is None
+        assert cache.key("openai/gpt-4", "prompt", 0) == cache.key("openai/gpt-4", "prompt", 0.0)
+        assert cache.key("openai/gpt-4", "prompt", 0, 2000) == request_key("openai/gpt-4", "prompt", 0, 2000)
+    
+    def test_stats_count_hits_and_misses(self):
+        """Test that lookups are counted."""
+        cache = LLMCache()
+        key = cache.key("openai/gpt-4", "prompt", 0)
+        assert cache.get(key) is None
+        cache.set(key, "response")
+        assert cache.get(key) == "response"
+        assert cache.stats == {"hits": 1, "misses": 1}
+
+
+class TestSemanticCache:
+    """Test similarity lookup for near-duplicate prompts."""
+    
+    @staticmethod
+    def fake_encoder(prompts):
+        np = pytest.importorskip("numpy")
+        vectors = {
+            "What is the capital of France?": [1.0, 0.0],
+            "Tell me France's capital": [0.99, 0.14],
+            "Write a haiku": [0.0, 1.0],
+        }
+        return np.array([vectors[p] for p in prompts], dtype=np.float32)
+    
+    def test_similar_prompt_hits(self):
+        """Test that a paraphrase is answered from the cache."""
+        cache = SemanticCache(encoder=self.fake_encoder)
+        cache.set(cache.key("openai/gpt-4", "What is the capital of France?", 0), "Paris")
+        
+        assert cache.get(cache.key("openai/gpt-4", "Tell me France's capital", 0)) == "Paris"
+        assert cache.get(cache.key("openai/gpt-4", "Write a haiku", 0)) is None
+        assert cache.stats == {"hits": 1, "misses": 1, "semantic_hits": 1}
+    
+    def test_different_model_misses(self):
+        """Test that responses are not shared across models."""
+        cache = SemanticCache(encoder=self.fake_encoder)
+        cache.set(cache.key("openai/gpt-4", "What is the capital of France?", 0), "Paris")
+        
+        assert cache.get(cache.key("claude/claude-3", "Tell me France's capital", 0)) is None
+    
+    def test_model_loaded_once_across_threads(self, monkeypatch):
+        """Test that concurrent first lookups share one lazily loaded model."""
+        loads = []
+        
+        class SentenceTransformer:
+            def __init__(self, name):
+                loads.append(name)
+                time.sleep(0.05)
+            
+            def encode(self, prompts, normalize_embeddings=False):
+                return [[1.0, 0.0] for _ in prompts]
+        
+        monkeypatch.setitem(sys.modules, "sentence_transformers", SimpleNamespace(SentenceTransformer=SentenceTransformer))
+        cache = SemanticCache()
+        threads = [threading.Thread(target=cache._encode, args=(f"prompt {i}",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert loads == ["all-MiniLM-L6-v2"]
+    
+    def test_lookup_holds_lock(self):
+        """Test that the index is searched under the lock that guards add()."""
+        cache = SemanticCache(encoder=self.fake_encoder)
+        cache.set(cache.key("openai/gpt-4", "What is the capital of France?", 0), "Paris")
+        index = next(iter(cache._indexes.values()))
+        nearest = index.nearest
+        
+        def locked_nearest(vector, now):
+            assert cache._lock.locked()
+            return nearest(vector, now)
+        
+        with patch.object(index, "nearest", side_effect=locked_nearest):
+            assert cache.get(cache.key("openai/gpt-4", "Tell me France's capital", 0)) == "Paris"
@@ -2,9 +2,19 @@
 Tests for LLM client implementations.
 """
 
+import asyncio
+import json
+import threading
+import httpx
 import pytest
-from unittest.mock import Mock, patch
-from llm_magic.clients import LLMClientBase, OpenAIClient, ClaudeClient, ClientFactory
+import requests
+import responses
+from unittest.mock import AsyncMock, patch
+from llm_magic.breaker import CircuitOpenError, get_breaker
+from llm_magic.cache import LLMCache, SemanticCache
+from llm_magic.clients import _ENV_KEYS, _get_session, LLMClientBase, OpenAIClient, ClaudeClient, ClientFactory, ProviderStreamError
+
+from .conftest import FakeResp
 
 
 class TestLLMClientBase:
@@ -14,114 +24,458 @@ class TestLLMClientBase:
         """Test that abstract methods raise NotImplementedError."""
         with pytest.raises(TypeError):
             LLMClientBase()
+    
+    def test_gather_prompts_bounds_concurrency(self):
+        """Test gather_prompts preserves order and caps in-flight calls."""
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def fake_acall_model(prompt, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return prompt.upper()
+        
+        client = OpenAIClient(api_key="test-key")
+        with patch.object(OpenAIClient, "acall_model", side_effect=fake_acall_model):
+            prompts = [f"prompt {i}" for i in range(10)]
+            results = asyncio.run(client.gather_prompts(prompts, concurrency=3))
+        
+        assert results == [p.upper() for p in prompts]
+        assert max_in_flight == 3
 
 
-class TestOpenAIClient:
-    """Test OpenAI client implementation."""
+CLIENT_CLASSES = {"openai": OpenAIClient, "claude": ClaudeClient}
+
+
+@pytest.fixture(scope="module")
+def clients():
+    """Default-configured clients shared by the read-only tests in this module."""
+    return {provider: cls(api_key="test-key") for provider, cls in CLIENT_CLASSES.items()}
+
+
+class TestClientConfiguration:
+    """Test construction and naming common to all clients."""
     
-    def test_init_with_api_key(self):
+    @pytest.mark.parametrize("provider,default_model", [
+        ("openai", "gpt-4"),
+        ("claude", "claude-3-sonnet-20240229"),
+    ])
+    def test_init_with_api_key(self, clients, provider, default_model):
         """Test initialization with API key."""
-        client = OpenAIClient(api_key="test-key")
-        assert client.api_key == "test-key"
-        assert client.model == "gpt-4"
+        assert clients[provider].api_key == "test-key"
+        assert clients[provider].model == default_model
+        assert not hasattr(clients[provider], "__dict__")
     
-    def test_init_without_api_key(self):
+    @pytest.mark.parametrize("provider,message", [
+        ("openai", "OpenAI API key not provided"),
+        ("claude", "Anthropic API key not provided"),
+    ])
+    def test_init_without_api_key(self, monkeypatch, provider, message):
         """Test initialization without API key raises error."""
-        with patch.dict('os.environ', {}, clear=True):
-            with pytest.raises(ValueError, match="OpenAI API key not provided"):
-                OpenAIClient()
+        monkeypatch.delenv(_ENV_KEYS[provider], raising=False)
+        with pytest.raises(ValueError, match=message):
+            CLIENT_CLASSES[provider]()
+    
+    @pytest.mark.parametrize("provider,result,expected", [
+        ("openai", {"choices": [{"message": {"content": "  Hello, world!\n"}}]}, "Hello, world!"),
+        ("claude", {"content": [{"type": "text", "text": "Hello from Claude!\n"}]}, "Hello from Claude!"),
+    ])
+    def test_parse_response(self, clients, provider, result, expected):
+        """Test extracting the response text from a decoded body."""
+        assert clients[provider]._parse_response(result) == expected
     
-    @patch('llm_magic.clients.requests.post')
-    def test_call_model_success(self, mock_post):
+    @pytest.mark.parametrize("provider", ["openai", "claude"])
+    def test_parse_response_malformed(self, clients, provider):
+        """Test that an unexpected body shape raises a lookup error."""
+        with pytest.raises((KeyError, IndexError)):
+            clients[provider]._parse_response({"choices": [], "content": []})
+    
+    @pytest.mark.parametrize("provider,model,expected", [
+        ("openai", "gpt-3.5-turbo", "openai/gpt-3.5-turbo"),
+        ("claude", "claude-3-opus-20240229", "claude/claude-3-opus-20240229"),
+    ])
+    def test_get_model_name(self, provider, model, expected):
+        """Test model name generation."""
+        client = CLIENT_CLASSES[provider](api_key="test-key", model=model)
+        assert client.get_model_name() == expected
+
+
+class TestOpenAIClient:
+    """Test OpenAI client implementation."""
+    
+    def test_call_model_success(self, mocked_llm):
         """Test successful API call."""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "choices": [{"message": {"content": "Hello, world!"}}]
-        }
-        mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
-        
         client = OpenAIClient(api_key="test-key")
         result = client.call_model("Test prompt")
         
         assert result == "Hello, world!"
-        mock_post.assert_called_once()
+        assert len(mocked_llm.calls) == 1
+        
+        request = mocked_llm.calls[0].request
+        assert request.headers["Content-Type"] == "application/json"
+        assert json.loads(request.body)["messages"] == [{"role": "user", "content": "Test prompt"}]
+    
+    def test_prompt_cache_key_sent(self, mocked_llm):
+        """Test that prompt_cache_key is forwarded in the payload."""
+        client = OpenAIClient(api_key="test-key")
+        client.call_model("Test prompt", prompt_cache_key="notebook-42")
+        
+        assert json.loads(mocked_llm.calls[0].request.body)["prompt_cache_key"] == "notebook-42"
+    
+    def test_call_model_cached(self, mocked_llm):
+        """Test that identical deterministic calls hit the API once."""
+        client = OpenAIClient(api_key="test-key", cache=LLMCache())
+        assert client.call_model("Test prompt", temperature=0) == "Hello, world!"
+        assert client.call_model("Test prompt", temperature=0) == "Hello, world!"
+        
+        assert len(mocked_llm.calls) == 1
+        assert client.cache_stats == {"hits": 1, "misses": 1}
     
-    @patch('llm_magic.clients.requests.post')
-    def test_call_model_api_error(self, mock_post):
+    def test_call_model_api_error(self, mocked_llm):
         """Test API error handling."""
-        mock_post.side_effect = Exception("API Error")
+        mocked_llm.replace(
+            responses.POST,
+            "https://api.openai.com/v1/chat/completions",
+            body=requests.exceptions.ConnectionError("API Error")
+        )
         
         client = OpenAIClient(api_key="test-key")
         
-        with pytest.raises(Exception, match="OpenAI API error"):
+        for _ in range(5):
+            with pytest.raises(Exception, match="OpenAI API error"):
+                client.call_model("Test prompt")
+        
+        # The circuit is now open, so the next call fails without a request
+        with pytest.raises(CircuitOpenError):
             client.call_model("Test prompt")
+        assert len(mocked_llm.calls) == 5
     
-    def test_get_model_name(self):
-        """Test model name generation."""
-        client = OpenAIClient(api_key="test-key", model="gpt-3.5-turbo")
-        assert client.get_model_name() == "openai/gpt-3.5-turbo"
+    def test_call_model_stream(self, mock_session):
+        """Test streaming yields content deltas in order."""
+        mock_session.post.return_value = FakeResp(lines=[
+            b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+            b'',
+            b'data: {"choices": [{"delta": {"content": "Hello, "}}]}',
+            b'data: {"choices": [{"delta": {"content": "world!"}}]}',
+            b'data: [DONE]',
+        ])
+        
+        client = OpenAIClient(api_key="test-key")
+        chunks = list(client.call_model_stream("Test prompt"))
+        
+        assert chunks == ["Hello, ", "world!"]
+        assert json.loads(mock_session.post.call_args.kwargs["data"])["stream"] is True
+    
+    def test_call_model_stream_cached(self, mock_session):
+        """Test that a fully read deterministic stream is replayed from the cache."""
+        mock_session.post.return_value = FakeResp(lines=[
+            b'data: {"choices": [{"delta": {"content": "Hello, "}}]}',
+            b'data: {"choices": [{"delta": {"content": "world!"}}]}',
+            b'data: [DONE]',
+        ])
+        
+        client = OpenAIClient(api_key="test-key", cache=LLMCache())
+        assert list(client.call_model_stream("Test prompt", temperature=0)) == ["Hello, ", "world!"]
+        assert list(client.call_model_stream("Test prompt", temperature=0)) == ["Hello, world!"]
+        
+        mock_session.post.assert_called_once()
+    
+    @patch('llm_magic.clients.get_async_client')
+    def test_acall_model_success(self, mock_get_client):
+        """Test successful async API call."""
+        mock_get_client.return_value.post = AsyncMock(return_value=FakeResp({
+            "choices": [{"message": {"content": "Hello, async world!"}}]
+        }))
+        
+        client = OpenAIClient(api_key="test-key")
+        result = asyncio.run(client.acall_model("Test prompt"))
+        
+        assert result == "Hello, async world!"
+        mock_get_client.return_value.post.assert_awaited_once()
+    
+    @patch('llm_magic.clients.get_async_client')
+    def test_acall_model_semantic_cache_off_loop(self, mock_get_client):
+        """Test that the semantic cache's encoder runs outside the event loop thread."""
+        np = pytest.importorskip("numpy")
+        encoder_threads = []
+        
+        def encoder(prompts):
+            encoder_threads.append(threading.get_ident())
+            return np.array([[1.0, 0.0] for _ in prompts], dtype=np.float32)
+        
+        mock_get_client.return_value.post = AsyncMock(return_value=FakeResp({
+            "choices": [{"message": {"content": "Paris"}}]
+        }))
+        client = OpenAIClient(api_key="test-key", cache=SemanticCache(encoder=encoder))
+        
+        async def ask_twice():
+            await client.acall_model("What is the capital of France?", temperature=0)
+            return await client.acall_model("Tell me France's capital", temperature=0), threading.get_ident()
+        
+        result, loop_thread = asyncio.run(ask_twice())
+        
+        assert result == "Paris"
+        mock_get_client.return_value.post.assert_awaited_once()
+        assert len(encoder_threads) == 2 and loop_thread not in encoder_threads
+    
+    @patch('llm_magic.clients.random.random', return_value=0.5)
+    @patch('llm_magic.clients.asyncio.sleep', new_callable=AsyncMock)
+    @patch('llm_magic.clients.get_async_client')
+    def test_acall_model_retries_with_retry_after(self, mock_get_client, mock_sleep, mock_random):
+        """Test that a 503 is retried after the provider's Retry-After delay plus jitter."""
+        statuses = iter([503, 200])
+        
+        def handler(request):
+            status = next(statuses)
+            if status == 503:
+                return httpx.Response(503, headers={"Retry-After": "2"})
+            return httpx.Response(200, json={"choices": [{"message": {"content": "Recovered"}}]})
+        
+        mock_get_client.return_value = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        client = OpenAIClient(api_key="test-key")
+        assert asyncio.run(client.acall_model("Test prompt")) == "Recovered"
+        mock_sleep.assert_awaited_once_with(2.25)
+        assert get_breaker("openai/gpt-4").state == "closed"
+    
+    @patch('llm_magic.clients.asyncio.sleep', new_callable=AsyncMock)
+    @patch('llm_magic.clients.get_async_client')
+    def test_acall_model_does_not_retry_502(self, mock_get_client, mock_sleep):
+        """Test that a 502, which may follow a processed request, is not replayed."""
+        requests_seen = []
+        
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(502)
+        
+        mock_get_client.return_value = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        client = OpenAIClient(api_key="test-key")
+        with pytest.raises(Exception, match="OpenAI API error"):
+            asyncio.run(client.acall_model("Test prompt"))
+        
+        assert len(requests_seen) == 1
+        mock_sleep.assert_not_awaited()
+    
+    @patch('llm_magic.clients.random.random', return_value=0.0)
+    @patch('llm_magic.clients.asyncio.sleep', new_callable=AsyncMock)
+    @patch('llm_magic.clients.get_async_client')
+    def test_acall_model_breaker_counts_exhausted_retries_once(self, mock_get_client, mock_sleep, mock_random):
+        """Test that a call which exhausts its retries is one breaker failure."""
+        requests_seen = []
+        
+        def handler(request):
+            requests_seen.append(request)
+            return httpx.Response(429)
+        
+        mock_get_client.return_value = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        
+        client = OpenAIClient(api_key="test-key")
+        with pytest.raises(Exception, match="OpenAI API error"):
+            asyncio.run(client.acall_model("Test prompt"))
+        
+        assert len(requests_seen) == 6
+        assert [call.args[0] for call in mock_sleep.await_args_list] == [0.25, 0.5, 1.0, 2.0, 4.0]
+        assert get_breaker("openai/gpt-4")._failures == 1
+    
+    def test_batch_call(self, mock_session):
+        """Test that the input file is uploaded and outputs are returned in prompt order."""
+        mock_session.post.side_effect = [
+            FakeResp({"id": "file-in"}),
+            FakeResp({"id": "batch-1", "status": "completed", "output_file_id": "file-out"}),
+        ]
+        mock_session.get.return_value = FakeResp(lines=[
+            json.dumps({"custom_id": "i-1", "error": None, "response": {"body": {"choices": [{"message": {"content": "two"}}]}}}).encode(),
+            json.dumps({"custom_id": "i-0", "error": None, "response": {"body": {"choices": [{"message": {"content": "one"}}]}}}).encode(),
+        ])
+        
+        client = OpenAIClient(api_key="test-key")
+        assert client.batch_call(["first", "second"], poll_interval=0) == ["one", "two"]
+        
+        assert json.loads(mock_session.post.call_args.kwargs["data"])["input_file_id"] == "file-in"
+        mock_session.get.assert_called_once()
+    
+    def test_batch_call_failed_requests(self, mock_session):
+        """Test that requests in the error file are reported by custom_id."""
+        mock_session.post.side_effect = [
+            FakeResp({"id": "file-in"}),
+            FakeResp({"id": "batch-1", "status": "completed", "output_file_id": None, "error_file_id": "file-err"}),
+        ]
+        mock_session.get.return_value = FakeResp(lines=[
+            json.dumps({
+                "custom_id": "i-0",
+                "error": None,
+                "response": {"status_code": 400, "body": {"error": {"message": "Invalid model"}}}
+            }).encode(),
+        ])
+        
+        client = OpenAIClient(api_key="test-key")
+        with pytest.raises(Exception, match="i-0: Invalid model"):
+            client.batch_call(["first"], poll_interval=0)
+        
+        assert mock_session.get.call_args.args[0].endswith("/files/file-err/content")
+    
+    def test_batch_call_without_output_file(self, mock_session):
+        """Test that a batch with no output file fails instead of fetching /files/None."""
+        mock_session.post.side_effect = [
+            FakeResp({"id": "file-in"}),
+            FakeResp({"id": "batch-1", "status": "completed", "output_file_id": None, "error_file_id": None}),
+        ]
+        
+        client = OpenAIClient(api_key="test-key")
+        with pytest.raises(Exception, match="without an output file"):
+            client.batch_call(["first"], poll_interval=0)
+        
+        mock_session.get.assert_not_called()
 
 
 class TestClaudeClient:
     """Test Claude client implementation."""
     
-    def test_init_with_api_key(self):
-        """Test initialization with API key."""
+    def test_call_model_success(self, mocked_llm):
+        """Test successful API call."""
         client = ClaudeClient(api_key="test-key")
-        assert client.api_key == "test-key"
-        assert client.model == "claude-3-sonnet-20240229"
+        result = client.call_model("Test prompt")
+        
+        assert result == "Hello from Claude!"
+        assert len(mocked_llm.calls) == 1
     
-    def test_init_without_api_key(self):
-        """Test initialization without API key raises error."""
-        with patch.dict('os.environ', {}, clear=True):
-            with pytest.raises(ValueError, match="Anthropic API key not provided"):
-                ClaudeClient()
+    def test_cache_control_header_sent(self, mocked_llm):
+        """Test that a cached system prompt carries an ephemeral cache_control marker."""
+        client = ClaudeClient(api_key="test-key")
+        client.call_model("Test prompt", system="You are a data analyst.", cache_system=True)
+        
+        payload = json.loads(mocked_llm.calls[0].request.body)
+        assert payload["system"] == [{
+            "type": "text",
+            "text": "You are a data analyst.",
+            "cache_control": {"type": "ephemeral"}
+        }]
     
-    @patch('llm_magic.clients.requests.post')
-    def test_call_model_success(self, mock_post):
-        """Test successful API call."""
-        mock_response = Mock()
-        mock_response.json.return_value = {
-            "content": [{"text": "Hello from Claude!"}]
-        }
-        mock_response.raise_for_status.return_value = None
-        mock_post.return_value = mock_response
+    def test_call_model_stream(self, mock_session):
+        """Test streaming yields text deltas in order."""
+        mock_session.post.return_value = FakeResp(lines=[
+            b'event: message_start',
+            b'data: {"type": "message_start", "message": {}}',
+            b'event: content_block_delta',
+            b'data: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "Hello "}}',
+            b'event: content_block_delta',
+            b'data: {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "from Claude!"}}',
+            b'event: message_stop',
+            b'data: {"type": "message_stop"}',
+        ])
         
         client = ClaudeClient(api_key="test-key")
-        result = client.call_model("Test prompt")
+        chunks = list(client.call_model_stream("Test prompt"))
         
-        assert result == "Hello from Claude!"
-        mock_post.assert_called_once()
+        assert chunks == ["Hello ", "from Claude!"]
     
-    def test_get_model_name(self):
-        """Test model name generation."""
-        client = ClaudeClient(api_key="test-key", model="claude-3-opus-20240229")
-        assert client.get_model_name() == "claude/claude-3-opus-20240229"
+    def test_call_model_stream_error_event(self, mock_session):
+        """Test that an SSE error event is raised and counted as a breaker failure."""
+        mock_session.post.return_value = FakeResp(lines=[
+            b'event: error',
+            b'data: {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}',
+        ])
+        
+        client = ClaudeClient(api_key="test-key")
+        with pytest.raises(ProviderStreamError, match="Anthropic API error: Overloaded"):
+            list(client.call_model_stream("Test prompt"))
+        
+        assert get_breaker(client.get_model_name())._failures == 1
+    
+    @patch('llm_magic.clients.get_async_client')
+    def test_acall_model_success(self, mock_get_client):
+        """Test successful async API call."""
+        mock_get_client.return_value.post = AsyncMock(return_value=FakeResp({
+            "content": [{"text": "Hello async from Claude!"}]
+        }))
+        
+        client = ClaudeClient(api_key="test-key")
+        result = asyncio.run(client.acall_model("Test prompt"))
+        
+        assert result == "Hello async from Claude!"
+        mock_get_client.return_value.post.assert_awaited_once()
+    
+    def test_batch_call(self, mock_session):
+        """Test that batch results are polled for and returned in prompt order."""
+        mock_session.post.return_value = FakeResp({"id": "batch-1", "processing_status": "in_progress"})
+        mock_session.get.side_effect = [
+            FakeResp({"id": "batch-1", "processing_status": "ended", "results_url": "https://results"}),
+            FakeResp(lines=[
+                json.dumps({"custom_id": "i-1", "result": {"type": "succeeded", "message": {"content": [{"text": "two"}]}}}).encode(),
+                json.dumps({"custom_id": "i-0", "result": {"type": "succeeded", "message": {"content": [{"text": "one"}]}}}).encode(),
+            ]),
+        ]
+        
+        client = ClaudeClient(api_key="test-key")
+        assert client.batch_call(["first", "second"], poll_interval=0) == ["one", "two"]
+        
+        requests_sent = json.loads(mock_session.post.call_args.kwargs["data"])["requests"]
+        assert [r["custom_id"] for r in requests_sent] == ["i-0", "i-1"]
+        assert requests_sent[1]["params"]["messages"][0]["content"] == "second"
 
 
 class TestClientFactory:
     """Test the client factory."""
     
-    def test_create_openai_client(self):
+    def test_create_openai_client(self, monkeypatch):
         """Test creating OpenAI client."""
-        with patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}):
-            client = ClientFactory.create_client("openai")
-            assert isinstance(client, OpenAIClient)
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        client = ClientFactory.create_client("openai")
+        assert isinstance(client, OpenAIClient)
     
-    def test_create_claude_client(self):
+    def test_create_claude_client(self, monkeypatch):
         """Test creating Claude client."""
-        with patch.dict('os.environ', {'ANTHROPIC_API_KEY': 'test-key'}):
-            client = ClientFactory.create_client("claude")
-            assert isinstance(client, ClaudeClient)
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        client = ClientFactory.create_client("claude")
+        assert isinstance(client, ClaudeClient)
     
     def test_invalid_provider(self):
         """Test invalid provider raises error."""
         with pytest.raises(ValueError, match="Unsupported LLM provider"):
             ClientFactory.create_client("invalid")
     
+    def test_close(self):
+        """Test closing the shared session."""
+        session = _get_session()
+        with patch.object(session, "close") as mock_close:
+            ClientFactory.close()
+        
+        mock_close.assert_called_once()
+        assert _get_session() is not session
+    
+    def test_session_retries_post_only_on_rejections(self):
+        """Test that POSTs are not retried on statuses the provider may have processed."""
+        retry = _get_session().get_adapter("https://api.openai.com").max_retries
+        
+        assert retry.is_retry("POST", 429) and retry.is_retry("POST", 503)
+        assert not retry.is_retry("POST", 500) and not retry.is_retry("POST", 502)
+        assert retry.is_retry("GET", 502)
+        if hasattr(retry, "backoff_jitter"):
+            assert retry.backoff_jitter > 0
+    
     def test_get_available_providers(self):
         """Test getting available providers."""
         providers = ClientFactory.get_available_providers()
-        assert "openai" in providers
-        assert "claude" in providers
\ No newline at end of file
+        assert providers == ("openai", "claude")
+    
+    def test_register_provider(self, monkeypatch):
+        """Test registering a new provider class."""
+        monkeypatch.setattr(ClientFactory, "_REGISTRY", dict(ClientFactory._REGISTRY))
+        
+        class EchoClient(LLMClientBase):
+            def call_model(self, prompt, **kwargs):
+                return prompt
+            
+            def get_model_name(self):
+                return "echo/echo"
+        
+        ClientFactory.register("Echo", EchoClient)
+        
+        assert "echo" in ClientFactory.get_available_providers()
+        assert isinstance(ClientFactory.create_client("echo"), EchoClient)
+        with pytest.raises(TypeError):
+            ClientFactory.register("bad", object)
\ No newline at end of file
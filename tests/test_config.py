@@ -0,0 +1,47 @@
+"""
+Tests for configuration loading.
+"""
+
+import os
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from llm_magic.config import ConfigManager
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    """A config file with an empty shared parse cache."""
+    monkeypatch.setattr(ConfigManager, "_file_cache", {})
+    path = tmp_path / "config.yaml"
+    path.write_text("debug: true\nmax_tokens: 500\n")
+    return str(path)
+
+
+class TestConfigFileCache:
+    """Test reuse of parsed config files across instances."""
+    
+    def test_unchanged_file_parsed_once(self, config_file):
+        """Test that a second ConfigManager reuses the parsed file."""
+        with patch("yaml.load", wraps=yaml.load) as mock_load:
+            first = ConfigManager(config_file)
+            second = ConfigManager(config_file)
+        
+        assert mock_load.call_count == 1
+        assert first.get("max_tokens") == second.get("max_tokens") == 500
+    
+    def test_changed_mtime_reparsed(self, config_file):
+        """Test that a file with a new modification time is parsed again."""
+        ConfigManager(config_file)
+        with open(config_file, "w") as f:
+            f.write("max_tokens: 800\n")
+        mtime_ns = os.stat(config_file).st_mtime_ns + 1_000_000_000
+        os.utime(config_file, ns=(mtime_ns, mtime_ns))
+        
+        with patch("yaml.load", wraps=yaml.load) as mock_load:
+            config = ConfigManager(config_file)
+        
+        assert mock_load.call_count == 1
+        assert config.get("max_tokens") == 800
@@ -0,0 +1,103 @@
+"""
+Tests for request logging and input validation.
+"""
+
+import gc
+import weakref
+from datetime import datetime
+from unittest.mock import patch
+
+from llm_magic.logging import LLMLogger, SecurityValidator
+
+
+class TestLLMLogger:
+    """Test writing and reading back request logs."""
+    
+    def test_entries_visible_after_get_recent_logs(self, tmp_path):
+        """Test that queued entries are written before the log is read."""
+        logger = LLMLogger(log_file=str(tmp_path / "requests.json"))
+        for i in range(3):
+            logger.log_request("openai", "gpt-4", f"prompt {i}", f"response {i}")
+        
+        logs = logger.get_recent_logs(count=2)
+        assert [entry["prompt"] for entry in logs] == ["prompt 1", "prompt 2"]
+        logger.close()
+    
+    def test_disabled_logger_does_not_start_writer(self, tmp_path):
+        """Test that a disabled logger neither starts the writer nor creates the file."""
+        logger = LLMLogger(log_file=str(tmp_path / "requests.json"), enabled=False)
+        with patch("llm_magic.logging._start_writer") as mock_start:
+            logger.log_request("openai", "gpt-4", "prompt", "response")
+        
+        mock_start.assert_not_called()
+        assert logger.get_recent_logs() == []
+    
+    def test_logging_after_clear_logs(self, tmp_path):
+        """Test that the log file is reopened after being cleared."""
+        logger = LLMLogger(log_file=str(tmp_path / "requests.json"))
+        logger.log_request("openai", "gpt-4", "before", "response")
+        logger.clear_logs()
+        assert logger.get_recent_logs() == []
+        
+        logger.log_request("openai", "gpt-4", "after", "response")
+        assert [entry["prompt"] for entry in logger.get_recent_logs()] == ["after"]
+        logger.close()
+    
+    def test_unserialisable_metadata_stringified(self, tmp_path):
+        """Test that metadata values JSON can't encode are written as strings."""
+        logger = LLMLogger(log_file=str(tmp_path / "requests.json"))
+        when = datetime(2024, 1, 2, 3, 4, 5)
+        logger.log_request("openai", "gpt-4", "prompt", "response", metadata={"when": when, "tags": {"a"}})
+        
+        metadata = logger.get_recent_logs()[0]["metadata"]
+        assert metadata["when"] in (str(when), when.isoformat())
+        assert metadata["tags"] == str({"a"})
+        logger.close()
+    
+    def test_closed_logger_can_be_collected(self, tmp_path):
+        """Test that the shared writer does not keep loggers alive."""
+        logger = LLMLogger(log_file=str(tmp_path / "requests.json"))
+        logger.log_request("openai", "gpt-4", "prompt", "response")
+        logger.close()
+        
+        ref = weakref.ref(logger)
+        del logger
+        gc.collect()
+        assert ref() is None
+
+
+class TestSecurityValidator:
+    """Test warnings for dangerous patterns in prompts and code."""
+    
+    def warnings(self, capsys):
+        return capsys.readouterr().out.splitlines()
+    
+    def test_prompt_matching_ignores_case(self, capsys):
+        """Test that prompt patterns match in any case and are reported in lower case."""
+        prompt = "Run SUDO Rm -Rf / please"
+        
+        assert SecurityValidator.sanitize_prompt(prompt) == prompt
+        assert self.warnings(capsys) == [
+            "Warning: Potentially dangerous pattern 'sudo' detected in prompt",
+            "Warning: Potentially dangerous pattern 'rm -rf' detected in prompt",
+        ]
+    
+    def test_code_matching_is_case_sensitive(self, capsys):
+        """Test that code operations only match with their exact spelling."""
+        SecurityValidator.sanitize_code_execution("OS.SYSTEM('ls')\nEval('1')")
+        assert self.warnings(capsys) == []
+        
+        SecurityValidator.sanitize_code_execution("os.system('ls')")
+        assert self.warnings(capsys) == ["Warning: Potentially dangerous operation 'os.system' detected in code"]
+    
+    def test_one_warning_per_distinct_pattern(self, capsys):
+        """Test that repeated patterns are reported once, in order of first appearance."""
+        SecurityValidator.sanitize_code_execution("exec('a')\neval('b')\nexec('c')\neval('d')")
+        
+        assert self.warnings(capsys) == [
+            "Warning: Potentially dangerous operation 'exec(' detected in code",
+            "Warning: Potentially dangerous operation 'eval(' detected in code",
+        ]
+        
+        SecurityValidator.sanitize_prompt("sudo ls; SUDO rm; Sudo cat")
+        assert self.warnings(capsys) == ["Warning: Potentially dangerous pattern 'sudo' detected in prompt"]
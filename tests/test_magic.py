@@ -0,0 +1,187 @@
+"""
+Tests for the %%llm cell magic.
+"""
+
+import asyncio
+import io
+import threading
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from rich.console import Console
+
+from llm_magic.bridge import IPythonBridge
+from llm_magic.clients import ClientFactory, LLMClientBase
+from llm_magic.magic import LLMMagic, _run_coroutine
+
+
+class FakeClient(LLMClientBase):
+    """Client that answers locally and records how it was called."""
+    
+    calls = []
+    
+    def __init__(self, api_key=None, model="fake-1"):
+        self.api_key = api_key
+        self.model = model
+    
+    def call_model(self, prompt, **kwargs):
+        self.calls.append((self.model, "call"))
+        return f"answer from {self.model}"
+    
+    def call_model_stream(self, prompt, **kwargs):
+        self.calls.append((self.model, "stream"))
+        yield "streamed "
+        yield f"answer from {self.model}"
+    
+    async def acall_model(self, prompt, **kwargs):
+        self.calls.append((self.model, "acall"))
+        return f"answer from {self.model}"
+    
+    def get_model_name(self):
+        return f"fake/{self.model}"
+
+
+class OtherClient(FakeClient):
+    def __init__(self, api_key=None, model="other-1"):
+        super().__init__(api_key, model)
+
+
+class BrokenClient(FakeClient):
+    def __init__(self, api_key=None, model="broken-1"):
+        super().__init__(api_key, model)
+    
+    async def acall_model(self, prompt, **kwargs):
+        self.calls.append((self.model, "acall"))
+        raise Exception("provider down")
+
+
+@pytest.fixture
+def magic(monkeypatch, tmp_path):
+    """An LLMMagic with fake providers, an empty namespace and captured output."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(ClientFactory, "_REGISTRY", dict(ClientFactory._REGISTRY))
+    ClientFactory.register("fake", FakeClient)
+    ClientFactory.register("other", OtherClient)
+    ClientFactory.register("broken", BrokenClient)
+    monkeypatch.setattr(FakeClient, "calls", [])
+    
+    output = io.StringIO()
+    monkeypatch.setattr("llm_magic.magic._get_console", lambda: Console(file=output, highlight=False, markup=False))
+    monkeypatch.setattr("llm_magic.magic.IPythonBridge", lambda shell: IPythonBridge(SimpleNamespace(user_ns={})))
+    
+    magic = LLMMagic(shell=None)
+    magic.output = output
+    return magic
+
+
+class TestSingleProvider:
+    """Test calling one provider."""
+    
+    def test_streams_by_default(self, magic):
+        """Test that the response is streamed unless --no-stream is given."""
+        magic.llm("-p fake", "Hi")
+        
+        assert FakeClient.calls == [("fake-1", "stream")]
+        assert "streamed answer from fake-1" in magic.output.getvalue()
+    
+    def test_no_stream(self, magic, capsys):
+        """Test that --no-stream waits for the full response."""
+        magic.llm("-p fake --no-stream --raw", "Hi")
+        
+        assert FakeClient.calls == [("fake-1", "call")]
+        assert capsys.readouterr().out == "answer from fake-1\n"
+    
+    def test_cached_only_at_temperature_zero(self, magic):
+        """Test that responses are reused by default only when deterministic."""
+        for _ in range(2):
+            magic.llm("-p fake --no-stream", "Hi")
+        for _ in range(2):
+            magic.llm("-p fake --no-stream -t 0", "Hi")
+        
+        assert FakeClient.calls == [("fake-1", "call")] * 3
+        assert "Using cached response from fake/fake-1" in magic.output.getvalue()
+    
+    def test_cache_flags(self, magic):
+        """Test that --cache caches at any temperature and --no-cache always calls."""
+        for _ in range(2):
+            magic.llm("-p fake --no-stream --cache", "Hi")
+        assert len(FakeClient.calls) == 1
+        
+        for _ in range(2):
+            magic.llm("-p fake --no-stream -t 0 --no-cache", "Hi")
+        assert len(FakeClient.calls) == 3
+
+
+class TestMultipleProviders:
+    """Test comparing comma-separated providers."""
+    
+    def test_queries_each_provider(self, magic):
+        """Test that every provider is called concurrently and shown in its own panel."""
+        magic.llm("-p fake,other", "Hi")
+        
+        assert sorted(FakeClient.calls) == [("fake-1", "acall"), ("other-1", "acall")]
+        output = magic.output.getvalue()
+        assert "Response from fake/fake-1" in output
+        assert "Response from fake/other-1" in output
+    
+    @pytest.mark.parametrize("flags, message", [
+        ("--model gpt-4", "--model can only be used with a single provider"),
+        ("--exec", "--exec and --inject require a single provider"),
+        ("--inject", "--exec and --inject require a single provider"),
+    ])
+    def test_single_provider_flags_rejected(self, magic, flags, message):
+        """Test that flags tied to one provider are rejected when comparing."""
+        magic.llm(f"-p fake,other {flags}", "Hi")
+        
+        assert FakeClient.calls == []
+        assert message in magic.output.getvalue()
+    
+    def test_cache_lookup_per_provider(self, magic):
+        """Test that only providers without a cached response are called."""
+        magic.llm("-p fake --no-stream -t 0", "Hi")
+        magic.llm("-p fake,other -t 0", "Hi")
+        magic.llm("-p fake,other -t 0", "Hi")
+        
+        assert FakeClient.calls == [("fake-1", "call"), ("other-1", "acall")]
+    
+    def test_error_shown_per_panel(self, magic):
+        """Test that one provider failing does not hide the others' responses."""
+        magic.llm("-p broken,fake -t 0", "Hi")
+        
+        output = magic.output.getvalue()
+        assert "Error from fake/broken-1: provider down" in output
+        assert "Response from fake/fake-1" in output
+        
+        # Failures are not cached
+        magic.llm("-p broken,fake -t 0", "Hi")
+        assert FakeClient.calls.count(("broken-1", "acall")) == 2
+        assert FakeClient.calls.count(("fake-1", "acall")) == 1
+
+
+def test_interrupt_cancels_background_coroutine(monkeypatch):
+    """Test that interrupting the wait cancels the coroutine instead of leaving it running."""
+    started = threading.Event()
+    cancelled = threading.Event()
+    
+    async def slow_call():
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    
+    submit = asyncio.run_coroutine_threadsafe
+    
+    def submit_then_interrupt(coro, loop):
+        future = submit(coro, loop)
+        started.wait(1)
+        future.result = Mock(side_effect=KeyboardInterrupt)
+        return future
+    
+    monkeypatch.setattr("llm_magic.magic.asyncio.run_coroutine_threadsafe", submit_then_interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        _run_coroutine(slow_call())
+    
+    assert cancelled.wait(1)